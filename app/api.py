@@ -1,28 +1,65 @@
+import base64
+import binascii
 import hashlib
+import json
 import os
 from collections import defaultdict
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from enum import StrEnum, auto
 from pathlib import Path
-from typing import Annotated, Any
+from typing import Annotated, Any, AsyncIterator
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, PlainTextResponse
+from fastapi.responses import (
+    HTMLResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from openfoodfacts import Flavor
 from openfoodfacts.images import generate_image_url
 from openfoodfacts.utils import URLBuilder, get_logger
-from peewee import DoesNotExist, fn
+from peewee import SQL, DoesNotExist, ModelSelect, Tuple, chunked, fn
 from playhouse.shortcuts import model_to_dict
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, ValidationError, model_validator
 
+from app import ticket_aggregates
+from app.async_db import AsyncSession
 from app.config import settings
+from app.database import ManagedPooledPostgresqlDatabase, PoolStats
+from app.etags import etag_matches, make_etag, not_modified
+from app.metrics import (
+    FLAGS_CREATED,
+    PrometheusMiddleware,
+    generate_metrics,
+    mark_process_dead,
+)
 from app.middleware.auth import UserStatus, get_auth_dependency
-from app.models import FlagModel, TicketModel, db
-from app.utils import init_sentry
+from app.middleware.auth_client import AuthClientStats, auth_client
+from app.middleware.session_cache import SessionCacheStats, session_cache
+from app.models import (
+    FlagModel,
+    ModeratorActionModel,
+    TicketDailyStatsModel,
+    TicketModel,
+    async_db,
+    db,
+    get_pool_stats,
+    url_hash,
+)
+from app.profiling import QueryProfilingMiddleware
+from app.response_cache import (
+    get_version,
+    get_version_async,
+    invalidate,
+    invalidate_async,
+    response_cache,
+)
+from app.stats import TicketStatsDelta
+from app.ticket_events import TicketEvent, TicketEventType, broker, notify, notify_async
+from app.utils import init_sentry, json_default
 
 logger = get_logger(level=settings.log_level.to_int())
 
@@ -83,15 +120,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(PrometheusMiddleware)
+if settings.query_profiling_enabled:
+    # Outside of the metrics middleware, so that the slow request reports
+    # are not counted in the request durations
+    app.add_middleware(QueryProfilingMiddleware)
 api_v1_router = APIRouter(prefix="/api/v1")
 templates = Jinja2Templates(directory=Path(__file__).parent / "templates")
-init_sentry(settings.sentry_dns)
+init_sentry(settings.sentry_dns, traces_sample_rate=settings.sentry_traces_sample_rate)
+
+# Maximum number of rows inserted by a single statement in bulk endpoints
+BULK_INSERT_BATCH_SIZE = 1000
 
 
 @app.on_event("startup")
 async def startup():
-    FastAPICache.init(InMemoryBackend(), prefix="nutripatrol-cache")
+    if isinstance(db, ManagedPooledPostgresqlDatabase):
+        # Open the minimum number of connections before serving requests
+        db.warm_up()
+    await async_db.open()
+    await broker.open(async_db.conninfo)
+    await auth_client.open()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if isinstance(db, ManagedPooledPostgresqlDatabase):
+        db.close_all()
+    await broker.close()
+    await async_db.close()
+    await auth_client.close()
+    await session_cache.close()
+    mark_process_dead()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -107,6 +169,16 @@ def robots_txt():
     return """User-agent: *\nDisallow: /"""
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics, aggregated over all workers.
+
+    Outside of /api, so that it is not exposed by the reverse proxy.
+    """
+    content, content_type = generate_metrics()
+    return Response(content, media_type=content_type)
+
+
 def _get_device_id(request: Request):
     """Get the device ID from the request, or generate one if not provided."""
     device_id = request.query_params.get("device_id")
@@ -167,6 +239,31 @@ class TicketCreate(BaseModel):
 
 class Ticket(TicketCreate):
     id: int = Field(..., description="ID of the ticket")
+    flag_count: int = Field(0, description="Number of flags of the ticket")
+    reasons: list[str] = Field(
+        default_factory=list, description="Distinct reasons of the flags"
+    )
+    sources: list[str] = Field(
+        default_factory=list, description="Distinct sources of the flags"
+    )
+    max_confidence: float | None = Field(
+        None,
+        description="Maximum confidence of the flags, only flags generated "
+        "by Robotoff have a confidence",
+    )
+    last_flagged_at: datetime | None = Field(
+        None, description="Creation datetime of the last flag of the ticket"
+    )
+    claimed_by: str | None = Field(
+        None, description="ID of the moderator who claimed the ticket"
+    )
+    claimed_until: datetime | None = Field(
+        None, description="Expiration datetime of the claim"
+    )
+    updated_at: datetime = Field(
+        ...,
+        description="Datetime of the last change of the ticket, including new " "flags",
+    )
 
 
 class SourceType(StrEnum):
@@ -282,7 +379,7 @@ class FlagsByTicketIdRequest(BaseModel):
 
 
 @api_v1_router.post("/flags")
-def create_flag(
+async def create_flag(
     flag: FlagCreate,
     request: Request,
     _: Any = Depends(get_auth_dependency(UserStatus.isLoggedIn)),
@@ -295,66 +392,376 @@ def create_flag(
     A ticket is created if it does not exist for this product or image.
     A ticket can be associated with multiple flags.
     """
-    with db:
-        # Check if the flag already exists
-        if (
-            FlagModel.get_or_none(
-                FlagModel.barcode == flag.barcode,
-                FlagModel.url == flag.url,
-                FlagModel.type == flag.type,
-                FlagModel.flavor == flag.flavor,
-                FlagModel.user_id == flag.user_id,
-                FlagModel.reason == flag.reason,
+    async with async_db.atomic() as session:
+        events: list[TicketEvent] = []
+        # Create the ticket with the same barcode, url, type and flavor if it
+        # does not exist, or reopen it
+        ticket = await _create_ticket(
+            session,
+            TicketCreate(
+                barcode=flag.barcode,
+                url=flag.url,
+                type=flag.type,
+                flavor=flag.flavor,
+                image_id=flag.image_id,
+            ),
+            events,
+        )
+        device_id = _get_device_id(request)
+        # The flag is not inserted if the user already flagged the ticket
+        # for the same reason
+        created_flag = await session.fetchone(
+            FlagModel.insert(
+                ticket=ticket,
+                device_id=device_id,
+                url_hash=url_hash(flag.url),
+                **flag.model_dump(),
             )
-            is not None
-        ):
+            .on_conflict_ignore()
+            .returning(FlagModel)
+        )
+        if created_flag is None:
+            # The transaction is rolled back, so the ticket is left untouched
             raise HTTPException(
                 status_code=409,
                 detail="Flag already exists",
             )
-
-        # Search for existing ticket
-        # With the same barcode, url, type and flavor
-        ticket = TicketModel.get_or_none(
-            TicketModel.barcode == flag.barcode,
-            TicketModel.url == flag.url,
-            TicketModel.type == flag.type,
-            TicketModel.flavor == flag.flavor,
+        await ticket_aggregates.add_flags(session, [created_flag.id])
+        events.append(
+            TicketEvent(
+                type=TicketEventType.flag_added,
+                ticket_id=ticket.id,
+                status=ticket.status,
+                flag_id=created_flag.id,
+            )
         )
-        # If no ticket found, create a new one
-        if ticket is None:
-            ticket = _create_ticket(
-                TicketCreate(
+        await notify_async(session, events)
+    await invalidate_async()
+    FLAGS_CREATED.labels(flag.source, flag.flavor).inc()
+    return created_flag
+
+
+class BulkFlagStatus(StrEnum):
+    """Status of an item of a bulk flag creation."""
+
+    # The flag was created
+    created = auto()
+    # The user already flagged the ticket for the same reason, either earlier
+    # in the batch or in a previous request
+    duplicate = auto()
+    # The item is not a valid flag, see `errors`
+    invalid = auto()
+
+
+class BulkFlagsRequest(BaseModel):
+    # Items are validated one by one, so that invalid items do not make the
+    # whole batch fail
+    flags: list[Any] = Field(
+        ...,
+        max_length=settings.flags_bulk_max_size,
+        description="Flags to create, with the same fields as for a single flag",
+    )
+
+
+class BulkFlagResult(BaseModel):
+    status: BulkFlagStatus = Field(..., description="Status of the item")
+    flag_id: int | None = Field(None, description="ID of the created flag")
+    ticket_id: int | None = Field(
+        None, description="ID of the ticket of the flag, if the item is valid"
+    )
+    errors: list[str] | None = Field(
+        None, description="Validation errors, if the item is invalid"
+    )
+
+
+class BulkFlagsResponse(BaseModel):
+    results: list[BulkFlagResult] = Field(
+        ..., description="Result of each item, in the order of the request"
+    )
+
+
+def _ticket_key(item: FlagCreate | TicketModel) -> tuple:
+    """Return the identity of the ticket of a flag (or of a ticket)."""
+    return (item.barcode, item.url, item.type, item.flavor)
+
+
+def _sort_key(key: tuple) -> tuple:
+    # Keys may contain None values, which cannot be compared to strings
+    return tuple((value is None, value or "") for value in key)
+
+
+async def _create_tickets_bulk(
+    session: AsyncSession,
+    flags: list[FlagCreate],
+    stats: TicketStatsDelta,
+    events: list[TicketEvent],
+) -> dict[tuple, int]:
+    """Create the tickets of the flags that do not exist yet, count them in
+    `stats` and add their creation to `events`.
+
+    Return the ticket ID of each ticket identity (see `_ticket_key`). Tickets
+    that already exist are left untouched.
+    """
+    tickets = {}
+    for flag in flags:
+        tickets.setdefault(
+            _ticket_key(flag),
+            dict(
+                url_hash=url_hash(flag.url),
+                **TicketCreate(
                     barcode=flag.barcode,
                     url=flag.url,
                     type=flag.type,
                     flavor=flag.flavor,
                     image_id=flag.image_id,
+                ).model_dump(),
+            ),
+        )
+    # Rows are always locked in the same order, so that concurrent batches
+    # cannot deadlock
+    rows = [tickets[key] for key in sorted(tickets, key=_sort_key)]
+    ticket_ids = {}
+    for batch in chunked(rows, BULK_INSERT_BATCH_SIZE):
+        # The no-op update makes existing tickets part of the returned rows
+        for ticket in await session.fetchall(
+            TicketModel.insert_many(batch).on_conflict(
+                conflict_target=[
+                    TicketModel.barcode,
+                    TicketModel.url_hash,
+                    TicketModel.type,
+                    TicketModel.flavor,
+                ],
+                update={TicketModel.status: TicketModel.status},
+            )
+            # xmax is 0 for inserted rows
+            .returning(TicketModel, SQL("xmax = 0").alias("inserted"))
+        ):
+            ticket_ids[_ticket_key(ticket)] = ticket.id
+            if ticket.inserted:
+                stats.add(ticket)
+                events.append(
+                    TicketEvent(
+                        type=TicketEventType.ticket_created,
+                        ticket_id=ticket.id,
+                        status=ticket.status,
+                    )
                 )
+    return ticket_ids
+
+
+@api_v1_router.post("/flags/bulk")
+async def create_flags_bulk(
+    bulk: BulkFlagsRequest,
+    request: Request,
+    _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
+) -> BulkFlagsResponse:
+    """Create flags in bulk.
+
+    This function is used by Robotoff to create many flags at once. Each item
+    is handled as with `POST /flags`, and gets its own status in the
+    response: `created`, `duplicate` (the user already flagged the ticket for
+    the same reason) or `invalid`. Invalid or duplicate items do not prevent
+    the other items from being created.
+    """
+    results: list[BulkFlagResult | None] = [None] * len(bulk.flags)
+    # Valid items, by flag identity. The first item of each identity is the
+    # one that is inserted, the other ones are duplicates.
+    items: dict[tuple, list[tuple[int, FlagCreate]]] = defaultdict(list)
+    for i, item in enumerate(bulk.flags):
+        try:
+            flag = FlagCreate.model_validate(item)
+        except ValidationError as e:
+            results[i] = BulkFlagResult(
+                status=BulkFlagStatus.invalid,
+                errors=[
+                    f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                    if error["loc"]
+                    else error["msg"]
+                    for error in e.errors()
+                ],
             )
-        elif ticket.status == TicketStatus.closed:
-            # Reopen the ticket if it was closed
-            ticket.status = TicketStatus.open
-            ticket.save()
+            continue
+        items[_ticket_key(flag) + (flag.user_id, flag.reason)].append((i, flag))
 
+    if items:
+        keys = sorted(items, key=_sort_key)
         device_id = _get_device_id(request)
-        return FlagModel.create(ticket=ticket, device_id=device_id, **flag.model_dump())
+        async with async_db.atomic() as session:
+            stats = TicketStatsDelta()
+            events: list[TicketEvent] = []
+            ticket_ids = await _create_tickets_bulk(
+                session, [items[key][0][1] for key in keys], stats, events
+            )
+            rows = []
+            for key in keys:
+                flag = items[key][0][1]
+                rows.append(
+                    dict(
+                        ticket=ticket_ids[_ticket_key(flag)],
+                        device_id=device_id,
+                        url_hash=url_hash(flag.url),
+                        **flag.model_dump(),
+                    )
+                )
+            # Flags that already exist are skipped
+            flag_ids = {}
+            for batch in chunked(rows, BULK_INSERT_BATCH_SIZE):
+                for created_flag in await session.fetchall(
+                    FlagModel.insert_many(batch)
+                    .on_conflict_ignore()
+                    .returning(
+                        FlagModel.id,
+                        FlagModel.ticket,
+                        FlagModel.user_id,
+                        FlagModel.reason,
+                    )
+                ):
+                    flag_ids[
+                        (
+                            created_flag.ticket_id,
+                            created_flag.user_id,
+                            created_flag.reason,
+                        )
+                    ] = created_flag.id
+            await ticket_aggregates.add_flags(session, sorted(flag_ids.values()))
+            # Reopen the tickets that got new flags, as `create_flag` does
+            reopened_ticket_ids = {ticket_id for ticket_id, _, _ in flag_ids}
+            if reopened_ticket_ids:
+                for ticket in await session.fetchall(
+                    TicketModel.update(status=TicketStatus.open)
+                    .where(
+                        TicketModel.id.in_(sorted(reopened_ticket_ids)),
+                        TicketModel.status != TicketStatus.open,
+                    )
+                    .returning(TicketModel)
+                ):
+                    stats.move(ticket, TicketStatus.closed, TicketStatus.open)
+                    events.append(
+                        TicketEvent(
+                            type=TicketEventType.status_changed,
+                            ticket_id=ticket.id,
+                            status=TicketStatus.open,
+                        )
+                    )
+            if (stats_query := stats.query()) is not None:
+                await session.execute(stats_query)
+            events.extend(
+                TicketEvent(
+                    type=TicketEventType.flag_added,
+                    ticket_id=ticket_id,
+                    status=TicketStatus.open,
+                    flag_id=flag_id,
+                )
+                for (ticket_id, _, _), flag_id in sorted(
+                    flag_ids.items(), key=lambda item: item[1]
+                )
+            )
+            await notify_async(session, events)
+        if flag_ids:
+            await invalidate_async()
+
+        for key in keys:
+            for n, (i, flag) in enumerate(items[key]):
+                ticket_id = ticket_ids[_ticket_key(flag)]
+                flag_id = flag_ids.get((ticket_id, flag.user_id, flag.reason))
+                if n == 0 and flag_id is not None:
+                    FLAGS_CREATED.labels(flag.source, flag.flavor).inc()
+                    results[i] = BulkFlagResult(
+                        status=BulkFlagStatus.created,
+                        flag_id=flag_id,
+                        ticket_id=ticket_id,
+                    )
+                else:
+                    results[i] = BulkFlagResult(
+                        status=BulkFlagStatus.duplicate, ticket_id=ticket_id
+                    )
+    return BulkFlagsResponse(results=results)
 
 
 class GetFlagsResponse(BaseModel):
     flags: list[Flag]
 
 
-@api_v1_router.get("/flags")
-def get_flags(
+class FlagsFormat(StrEnum):
+    """Output format of get_flags."""
+
+    # A JSON object with a `flags` list, see `GetFlagsResponse`
+    json = auto()
+    # One JSON-encoded flag per line
+    ndjson = auto()
+
+
+# Columns of the streamed flags: streamed responses are not filtered by the
+# response model, the other columns (e.g. `url_hash`) are not selected
+_FLAG_COLUMNS = [FlagModel._meta.columns[name] for name in Flag.model_fields]
+
+
+async def _stream_flags(
+    flags_query: ModelSelect, output_format: FlagsFormat
+) -> AsyncIterator[bytes]:
+    """Stream the flags selected by the query, reading them by batches with a
+    server-side cursor."""
+    separator = "\n" if output_format is FlagsFormat.ndjson else ","
+    if output_format is FlagsFormat.json:
+        yield b'{"flags":['
+    first_batch = True
+    async with async_db.atomic() as session:
+        async for flags in session.iter_batches(
+            flags_query, settings.flags_stream_batch_size
+        ):
+            lines = []
+            for flag in flags:
+                flag["ticket_id"] = flag.pop("ticket")
+                lines.append(json.dumps(flag, default=json_default))
+            chunk = separator.join(lines)
+            if output_format is FlagsFormat.ndjson:
+                chunk += "\n"
+            elif not first_batch:
+                chunk = "," + chunk
+            first_batch = False
+            yield chunk.encode()
+    if output_format is FlagsFormat.json:
+        yield b"]}"
+
+
+@api_v1_router.get(
+    "/flags",
+    response_model=GetFlagsResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def get_flags(
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    flavor: Flavor | None = None,
+    source: SourceType | None = None,
+    format: FlagsFormat = FlagsFormat.json,
     _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
-) -> GetFlagsResponse:
+) -> StreamingResponse:
     """Get all flags.
 
-    This function is used to get all flags.
+    This function is used to get all flags, optionally filtered by creation
+    date, flavor and source.
+
+    Flags are streamed as they are read from the database, so the memory
+    usage does not depend on the number of flags. Use `format=ndjson` to get
+    one flag per line.
     """
-    with db:
-        return GetFlagsResponse(flags=list(FlagModel.select().dicts()))
+    flags_query = FlagModel.select(*_FLAG_COLUMNS).order_by(FlagModel.id)
+    if created_after:
+        flags_query = flags_query.where(FlagModel.created_at >= created_after)
+    if created_before:
+        flags_query = flags_query.where(FlagModel.created_at < created_before)
+    if flavor:
+        flags_query = flags_query.where(FlagModel.flavor == flavor)
+    if source:
+        flags_query = flags_query.where(FlagModel.source == source)
+
+    media_type = (
+        "application/x-ndjson" if format is FlagsFormat.ndjson else "application/json"
+    )
+    return StreamingResponse(
+        _stream_flags(flags_query.dicts(), format), media_type=media_type
+    )
 
 
 @api_v1_router.get("/flags/{flag_id}")
@@ -372,83 +779,447 @@ def get_flag(
             raise HTTPException(status_code=404, detail="Not found")
 
 
-def _create_ticket(ticket: TicketCreate):
-    """Create a ticket."""
-    return TicketModel.create(**ticket.model_dump())
+async def _create_ticket(
+    session: AsyncSession, ticket: TicketCreate, events: list[TicketEvent]
+) -> TicketModel:
+    """Create a ticket.
+
+    If a ticket with the same barcode, url, type and flavor already exists,
+    it is reopened and returned instead. This is done in a single statement,
+    so concurrent calls for the same product never create duplicate tickets.
+    The creation or reopening of the ticket is added to `events`.
+    """
+    created_ticket = await session.fetchone(
+        TicketModel.insert(
+            url_hash=url_hash(ticket.url), **ticket.model_dump()
+        ).on_conflict(
+            conflict_target=[
+                TicketModel.barcode,
+                TicketModel.url_hash,
+                TicketModel.type,
+                TicketModel.flavor,
+            ],
+            update={TicketModel.status: TicketStatus.open},
+            # Only closed tickets are updated, so that we know whether the
+            # ticket was reopened
+            where=TicketModel.status != TicketStatus.open,
+        )
+        # xmax is 0 for inserted rows
+        .returning(TicketModel, SQL("xmax = 0").alias("inserted"))
+    )
+    if created_ticket is None:
+        # The ticket already exists and is open
+        return await session.fetchone(
+            TicketModel.select().where(
+                TicketModel.barcode == ticket.barcode,
+                TicketModel.url_hash == url_hash(ticket.url),
+                TicketModel.type == ticket.type,
+                TicketModel.flavor == ticket.flavor,
+            )
+        )
+    stats = TicketStatsDelta()
+    if created_ticket.inserted:
+        stats.add(created_ticket)
+        event_type = TicketEventType.ticket_created
+    else:
+        stats.move(created_ticket, TicketStatus.closed, TicketStatus.open)
+        event_type = TicketEventType.status_changed
+    await session.execute(stats.query())
+    events.append(
+        TicketEvent(
+            type=event_type,
+            ticket_id=created_ticket.id,
+            status=created_ticket.status,
+        )
+    )
+    return created_ticket
+
+
+class CountMode(StrEnum):
+    """How the total number of tickets is computed in get_tickets."""
+
+    # Exact count, with a COUNT(*) on the filtered tickets
+    exact = auto()
+    # Estimation by the query planner, much cheaper on large tables
+    estimated = auto()
+    # No count
+    none = auto()
 
 
 class GetTicketsResponse(BaseModel):
     """Response model for get_tickets endpoint."""
 
     tickets: list[Ticket]
-    max_page: int
+    max_page: int | None = Field(
+        None, description="Number of pages, null if the count is disabled"
+    )
+    count: int | None = Field(
+        None,
+        description="Number of tickets matching the filters (estimated if "
+        "`count=estimated`), null if the count is disabled",
+    )
+    next_cursor: str | None = Field(
+        None,
+        description="Cursor to pass to get the next page, null if this is the "
+        "last page",
+    )
+
+
+class TicketOrder(StrEnum):
+    """Sort order of get_tickets, always descending."""
+
+    created_at = auto()
+    flag_count = auto()
+
+
+def _encode_cursor(ticket: dict, order_by: TicketOrder) -> str:
+    """Encode the position of a ticket in the listing as an opaque cursor."""
+    value = ticket[order_by]
+    if order_by is TicketOrder.created_at:
+        value = value.isoformat()
+    payload = json.dumps([value, ticket["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor: str, order_by: TicketOrder) -> tuple[Any, int]:
+    """Decode a cursor generated by `_encode_cursor`."""
+    try:
+        value, ticket_id = json.loads(base64.urlsafe_b64decode(cursor))
+        if order_by is TicketOrder.created_at:
+            value = datetime.fromisoformat(value)
+        else:
+            value = int(value)
+        return value, int(ticket_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _count_tickets(
+    session: AsyncSession, tickets_query: ModelSelect, count_mode: CountMode
+) -> int | None:
+    """Count the tickets selected by the query, according to `count_mode`."""
+    if count_mode is CountMode.none:
+        return None
+
+    if count_mode is CountMode.estimated:
+        if tickets_query._where is None:
+            # Number of rows of the table, as estimated by the last ANALYZE
+            estimate = await session.scalar(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                (TicketModel._meta.table_name,),
+            )
+        else:
+            # Number of rows the planner expects the query to return
+            sql, params = tickets_query.sql()
+            plan = await session.scalar(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            estimate = plan[0]["Plan"]["Plan Rows"]
+        # The table has never been analyzed, fall back to an exact count
+        if estimate >= 0:
+            return int(estimate)
+
+    return await session.scalar(tickets_query.select(fn.COUNT(TicketModel.id)))
+
+
+async def _get_tickets_state(
+    session: AsyncSession, tickets_query: ModelSelect
+) -> tuple[int, datetime | None, Any]:
+    """Return the number of tickets selected by the query, their last update
+    date and the sum of their update dates, from which the ETag of the
+    listing is derived (see `app.etags`)."""
+    return await session.fetchone(
+        tickets_query.select(
+            fn.COUNT(TicketModel.id),
+            fn.MAX(TicketModel.updated_at),
+            fn.SUM(fn.date_part("epoch", TicketModel.updated_at)),
+        ).tuples()
+    )
+
+
+def _get_tickets_query(
+    barcode: str | None = None,
+    status: TicketStatus | None = None,
+    type_: IssueType | None = None,
+    reason: list[ReasonType] | None = None,
+) -> ModelSelect:
+    """Build the query selecting the tickets matching the filters."""
+    # Get IDs of flags with the specified filters
+    where_clause = []
+    if barcode:
+        where_clause.append(TicketModel.barcode == barcode)
+    if status:
+        where_clause.append(TicketModel.status == status)
+    if type_:
+        where_clause.append(TicketModel.type == type_)
+    if reason:
+        # Tickets with at least one flag with one of the reasons
+        where_clause.append(TicketModel.reasons.contains_any(*reason))
+
+    query = TicketModel.select()
+    if where_clause:
+        query = query.where(*where_clause)
+    return query
 
 
 @api_v1_router.get("/tickets")
-def get_tickets(
+async def get_tickets(
     barcode: str | None = None,
     status: TicketStatus | None = None,
     type_: IssueType | None = None,
     reason: Annotated[list[ReasonType] | None, Query()] = None,
     page: int = 1,
     page_size: int = 10,
+    cursor: str | None = None,
+    count: CountMode = CountMode.exact,
+    order_by: TicketOrder = TicketOrder.created_at,
+    if_none_match: Annotated[str | None, Header()] = None,
     _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
 ) -> GetTicketsResponse:
     """Get all tickets.
 
     This function is used to get all tickets with status open.
+
+    Tickets are sorted by creation date (most recent first) or by number of
+    flags (most flagged first), see `order_by`. Pages can be requested by
+    number (`page`), or with the `next_cursor` returned by the previous call
+    (`cursor`), in which case `page` is ignored. Cursor pagination is much
+    faster for deep pages.
+
+    The total number of tickets is only needed to compute `max_page`: use
+    `count=estimated` or `count=none` to make the request cheaper.
+
+    Responses have an ETag: if it matches the `If-None-Match` header, an
+    empty 304 response is returned. With `count=exact`, the ETag only changes
+    when the tickets matching the filters change, otherwise it changes with
+    any change of tickets or flags.
     """
-    with db:
-        offset = (page - 1) * page_size
-        # Get IDs of flags with the specified filters
-        where_clause = []
-        if barcode:
-            where_clause.append(TicketModel.barcode == barcode)
-        if status:
-            where_clause.append(TicketModel.status == status)
-        if type_:
-            where_clause.append(TicketModel.type == type_)
-        if reason:
-            subquery = FlagModel.select(FlagModel.ticket_id).where(
-                FlagModel.reason.in_(reason)
+    cache_key = response_cache.key(
+        "get_tickets",
+        barcode=barcode,
+        status=status,
+        type_=type_,
+        reason=reason,
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        count=count,
+        order_by=order_by,
+    )
+    tickets_query = _get_tickets_query(barcode, status, type_, reason)
+    async with async_db.atomic() as session:
+        version = await get_version_async(session)
+        cached = response_cache.get("get_tickets", cache_key, version)
+        if cached is not None:
+            if etag_matches(if_none_match, cached.headers["ETag"]):
+                return not_modified(cached.headers["ETag"])
+            return cached
+        # The ETag is computed before the tickets are loaded, so that it never
+        # covers changes that the response does not include
+        if count is CountMode.exact:
+            # The tickets are counted anyway, the ETag comes at no extra cost
+            total, *last_updates = await _get_tickets_state(session, tickets_query)
+            etag = make_etag(cache_key, total, *last_updates)
+        else:
+            # Computing the state of the tickets would cost as much as the
+            # count the client opted out of: the ETag changes with any write
+            etag = make_etag(cache_key, version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        if count is not CountMode.exact:
+            total = await _count_tickets(session, tickets_query, count)
+        max_page = (
+            None if total is None else total // page_size + int(total % page_size != 0)
+        )
+        order_field = getattr(TicketModel, order_by)
+        ordered_query = tickets_query.order_by(
+            order_field.desc(), TicketModel.id.desc()
+        )
+        if cursor:
+            ordered_query = ordered_query.where(
+                Tuple(order_field, TicketModel.id)
+                < Tuple(*_decode_cursor(cursor, order_by))
             )
-            where_clause.append(TicketModel.id.in_(subquery))
-
-        # Get the total number of tickets with the specified filters
-        count = TicketModel.select().where(*where_clause).count()
-        max_page = count // page_size + int(count % page_size != 0)
-        if page > max_page:
-            return GetTicketsResponse(tickets=[], max_page=max_page)
-        return GetTicketsResponse(
-            tickets=list(
-                TicketModel.select()
-                .where(*where_clause)
-                .order_by(TicketModel.created_at.desc())
-                .offset(offset)
-                .limit(page_size)
-                .dicts()
-            ),
-            max_page=max_page,
+        else:
+            if count is CountMode.exact and page > max_page:
+                return response_cache.set(
+                    "get_tickets",
+                    cache_key,
+                    version,
+                    GetTicketsResponse(tickets=[], max_page=max_page, count=total),
+                    headers={"ETag": etag},
+                )
+            ordered_query = ordered_query.offset((page - 1) * page_size)
+
+        # Fetch one more ticket, to know if there is a next page
+        tickets = await session.fetchall(ordered_query.limit(page_size + 1).dicts())
+
+    next_cursor = None
+    if len(tickets) > page_size:
+        tickets = tickets[:page_size]
+        next_cursor = _encode_cursor(tickets[-1], order_by)
+    return response_cache.set(
+        "get_tickets",
+        cache_key,
+        version,
+        GetTicketsResponse(
+            tickets=tickets, max_page=max_page, count=total, next_cursor=next_cursor
+        ),
+        headers={"ETag": etag},
+    )
+
+
+class ModeratorActionType(StrEnum):
+    """Type of a moderator action, see `ModeratorActionModel`."""
+
+    # The moderator claimed the ticket, to work on it
+    claim = auto()
+    # The moderator closed the ticket
+    close = auto()
+    # The moderator reopened the ticket
+    reopen = auto()
+
+    @classmethod
+    def from_status(cls, status: TicketStatus) -> "ModeratorActionType":
+        """Return the action setting the ticket status."""
+        return cls.close if status is TicketStatus.closed else cls.reopen
+
+
+class ClaimTicketsResponse(BaseModel):
+    tickets: list[Ticket] = Field(..., description="Claimed tickets, in priority order")
+    claimed_until: datetime = Field(
+        ..., description="Expiration datetime of the claims"
+    )
+
+
+@api_v1_router.post("/tickets/claim")
+async def claim_tickets(
+    n: int = Query(10, ge=1, le=100, description="Number of tickets to claim"),
+    user_id: str = Depends(get_auth_dependency(UserStatus.isModerator)),
+) -> ClaimTicketsResponse:
+    """Claim the next open tickets to moderate.
+
+    Tickets are handed out in priority order (most flagged first, then
+    oldest first), and each ticket is claimed by a single moderator: tickets
+    claimed by other moderators are skipped until their claim expires, after
+    `ticket_claim_lease` seconds. Tickets already claimed by the moderator
+    are returned again, with a renewed claim.
+
+    Concurrent calls never wait for each other: tickets being claimed by
+    another call are skipped (`FOR UPDATE SKIP LOCKED`).
+    """
+    now = datetime.utcnow()
+    claimed_until = now + timedelta(seconds=settings.ticket_claim_lease)
+    available_tickets = (
+        TicketModel.select(TicketModel.id)
+        .where(
+            TicketModel.status == TicketStatus.open,
+            (TicketModel.claimed_until.is_null())
+            | (TicketModel.claimed_until < now)
+            | (TicketModel.claimed_by == user_id),
         )
+        .order_by(TicketModel.flag_count.desc(), TicketModel.id)
+        .limit(n)
+        .for_update("FOR UPDATE SKIP LOCKED")
+    )
+    async with async_db.atomic() as session:
+        tickets = await session.fetchall(
+            TicketModel.update(claimed_by=user_id, claimed_until=claimed_until)
+            .where(TicketModel.id.in_(available_tickets))
+            .returning(TicketModel)
+            .dicts()
+        )
+        if tickets:
+            await session.execute(
+                ModeratorActionModel.insert_many(
+                    [
+                        dict(
+                            action_type=ModeratorActionType.claim,
+                            user_id=user_id,
+                            ticket=ticket["id"],
+                            created_at=now,
+                        )
+                        for ticket in tickets
+                    ]
+                )
+            )
+    if tickets:
+        await invalidate_async()
+    tickets.sort(key=lambda ticket: (-ticket["flag_count"], ticket["id"]))
+    return ClaimTicketsResponse(tickets=tickets, claimed_until=claimed_until)
+
+
+@api_v1_router.get("/tickets/events")
+async def get_ticket_events(
+    last_event_id: Annotated[str | None, Header()] = None,
+    _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
+) -> StreamingResponse:
+    """Stream the changes of tickets, as Server-Sent Events.
+
+    Events are `ticket_created`, `flag_added` and `status_changed`, with the
+    ID of the ticket and its new status (and the ID of the flag, for
+    `flag_added`) as data. They are sent as soon as the changes are
+    committed.
+
+    Streams are closed after a while, or if the client does not read the
+    events fast enough: clients reconnect with the ID of the last event they
+    got in the `Last-Event-ID` header (as `EventSource` does), to get the
+    events they missed. If the missed events are not available any more, a
+    `reset` event is sent: the client must reload the tickets.
+    """
+    return StreamingResponse(
+        broker.stream(last_event_id),
+        media_type="text/event-stream",
+        # Events must not be buffered by proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @api_v1_router.get("/tickets/{ticket_id}")
 def get_ticket(
-    ticket_id: int, _: Any = Depends(get_auth_dependency(UserStatus.isModerator))
-):
+    ticket_id: int,
+    if_none_match: Annotated[str | None, Header()] = None,
+    _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
+) -> Ticket:
     """Get a ticket by ID.
 
     This function is used to get a ticket by its ID.
+
+    Responses have an ETag: if it matches the `If-None-Match` header, an
+    empty 304 response is returned.
     """
+    cache_key = response_cache.key("get_ticket", ticket_id=ticket_id)
     with db:
+        version = get_version()
+        cached = response_cache.get("get_ticket", cache_key, version)
+        if cached is not None:
+            if etag_matches(if_none_match, cached.headers["ETag"]):
+                return not_modified(cached.headers["ETag"])
+            return cached
+        updated_at = (
+            TicketModel.select(TicketModel.updated_at)
+            .where(TicketModel.id == ticket_id)
+            .scalar()
+        )
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        etag = make_etag("get_ticket", ticket_id, updated_at)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         try:
-            return model_to_dict(TicketModel.get_by_id(ticket_id))
+            ticket = TicketModel.get_by_id(ticket_id)
         except DoesNotExist:
             raise HTTPException(status_code=404, detail="Not found")
+    return response_cache.set(
+        "get_ticket",
+        cache_key,
+        version,
+        # Cached responses are not filtered by the response model
+        Ticket(**model_to_dict(ticket)),
+        headers={"ETag": etag},
+    )
 
 
 @api_v1_router.post("/flags/batch")
-def get_flags_by_ticket_batch(
+async def get_flags_by_ticket_batch(
     flag_request: FlagsByTicketIdRequest,
     _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
 ):
@@ -456,9 +1227,16 @@ def get_flags_by_ticket_batch(
 
     This function is used to get all flags for tickets by there IDs.
     """
-    with db:
-        flags = list(
-            FlagModel.select()
+    cache_key = response_cache.key(
+        "get_flags_by_ticket_batch", ticket_ids=sorted(set(flag_request.ticket_ids))
+    )
+    async with async_db.atomic() as session:
+        version = await get_version_async(session)
+        cached = response_cache.get("get_flags_by_ticket_batch", cache_key, version)
+        if cached is not None:
+            return cached
+        flags = await session.fetchall(
+            FlagModel.select(*_FLAG_COLUMNS)
             .where(FlagModel.ticket_id.in_(flag_request.ticket_ids))
             .dicts()
         )
@@ -467,14 +1245,19 @@ def get_flags_by_ticket_batch(
     for flag in flags:
         ticket_id_to_flags[flag["ticket"]].append(flag)
 
-    return {"ticket_id_to_flags": dict(ticket_id_to_flags)}
+    return response_cache.set(
+        "get_flags_by_ticket_batch",
+        cache_key,
+        version,
+        {"ticket_id_to_flags": dict(ticket_id_to_flags)},
+    )
 
 
 @api_v1_router.put("/tickets/{ticket_id}/status")
 def update_ticket_status(
     ticket_id: int,
     status: TicketStatus,
-    _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
+    user_id: str = Depends(get_auth_dependency(UserStatus.isModerator)),
 ) -> Ticket:
     """Update the status of a ticket by ID.
 
@@ -482,12 +1265,163 @@ def update_ticket_status(
     """
     with db:
         try:
-            ticket = TicketModel.get_by_id(ticket_id)
-            ticket.status = status
-            ticket.save()
-            return ticket
+            # The ticket is locked, so that concurrent updates are counted
+            # correctly in the statistics
+            ticket = (
+                TicketModel.select()
+                .where(TicketModel.id == ticket_id)
+                .for_update()
+                .get()
+            )
         except DoesNotExist:
             raise HTTPException(status_code=404, detail="Not found")
+        stats = TicketStatsDelta()
+        stats.move(ticket, ticket.status, status)
+        if ticket.status != status:
+            notify(
+                [
+                    TicketEvent(
+                        type=TicketEventType.status_changed,
+                        ticket_id=ticket.id,
+                        status=status,
+                    )
+                ]
+            )
+        ticket.status = status
+        # The moderator is done with the ticket, release the claim
+        ticket.claimed_by = None
+        ticket.claimed_until = None
+        ticket.save()
+        # Set by the database, if the ticket changed
+        ticket.updated_at = (
+            TicketModel.select(TicketModel.updated_at)
+            .where(TicketModel.id == ticket_id)
+            .scalar()
+        )
+        stats.apply()
+        ModeratorActionModel.create(
+            action_type=ModeratorActionType.from_status(status),
+            user_id=user_id,
+            ticket=ticket,
+            created_at=datetime.utcnow(),
+        )
+    # After the commit, on a connection that is returned to the pool
+    with db.connection_context():
+        invalidate()
+    return ticket
+
+
+class BulkTicketStatusUpdate(BaseModel):
+    status: TicketStatus = Field(..., description="New status of the tickets")
+    ticket_ids: list[int] | None = Field(
+        None, description="IDs of the tickets to update"
+    )
+    barcode: str | None = Field(None, description="Update the tickets of this barcode")
+    type: IssueType | None = Field(None, description="Update the tickets of this type")
+    reason: list[ReasonType] | None = Field(
+        None, description="Update the tickets with a flag with one of these reasons"
+    )
+
+    @model_validator(mode="after")
+    def tickets_are_selected(self) -> "BulkTicketStatusUpdate":
+        """Validate that the tickets to update are selected, so that all
+        tickets are not updated by mistake."""
+        if self.ticket_ids is None and not (self.barcode or self.type or self.reason):
+            raise ValueError(
+                "`ticket_ids` or at least one filter (`barcode`, `type`, "
+                "`reason`) must be provided"
+            )
+        return self
+
+
+class BulkTicketStatusUpdateResponse(BaseModel):
+    count: int = Field(..., description="Number of updated tickets")
+
+
+@api_v1_router.put("/tickets/status")
+async def update_tickets_status(
+    update: BulkTicketStatusUpdate,
+    user_id: str = Depends(get_auth_dependency(UserStatus.isModerator)),
+) -> BulkTicketStatusUpdateResponse:
+    """Update the status of many tickets at once.
+
+    This function is used to close (or reopen) a list of tickets, or all the
+    tickets matching the filters (both can be combined). Tickets that
+    already have the requested status are left untouched. The action is
+    recorded for each updated ticket.
+    """
+    tickets_query = _get_tickets_query(
+        barcode=update.barcode, type_=update.type, reason=update.reason
+    ).where(TicketModel.status != update.status)
+    if update.ticket_ids is not None:
+        tickets_query = tickets_query.where(TicketModel.id.in_(update.ticket_ids))
+
+    now = datetime.utcnow()
+    async with async_db.atomic() as session:
+        # Lock the tickets first (always in the same order, so that
+        # concurrent updates cannot deadlock), to know their current status
+        tickets = await session.fetchall(
+            tickets_query.select(
+                TicketModel.id,
+                TicketModel.status,
+                TicketModel.flavor,
+                TicketModel.type,
+                TicketModel.created_at,
+            )
+            .order_by(TicketModel.id)
+            .for_update()
+        )
+        if not tickets:
+            return BulkTicketStatusUpdateResponse(count=0)
+
+        ticket_ids = [ticket.id for ticket in tickets]
+        await session.execute(
+            TicketModel.update(
+                status=update.status, claimed_by=None, claimed_until=None
+            ).where(TicketModel.id.in_(ticket_ids))
+        )
+        stats = TicketStatsDelta()
+        for ticket in tickets:
+            stats.move(ticket, ticket.status, update.status)
+        await session.execute(stats.query())
+        await notify_async(
+            session,
+            [
+                TicketEvent(
+                    type=TicketEventType.status_changed,
+                    ticket_id=ticket_id,
+                    status=update.status,
+                )
+                for ticket_id in ticket_ids
+            ],
+        )
+        action_type = ModeratorActionType.from_status(update.status)
+        await session.execute(
+            ModeratorActionModel.insert_many(
+                [
+                    dict(
+                        action_type=action_type,
+                        user_id=user_id,
+                        ticket=ticket_id,
+                        created_at=now,
+                    )
+                    for ticket_id in ticket_ids
+                ]
+            )
+        )
+    await invalidate_async()
+    return BulkTicketStatusUpdateResponse(count=len(ticket_ids))
+
+
+class DailyTicketStats(BaseModel):
+    """Number of tickets created on a given day."""
+
+    day: date = Field(..., description="Creation day of the tickets (UTC)")
+    n_tickets: int = Field(..., description="Number of tickets created that day")
+    tickets_by_status: dict[str, int] = Field(
+        ...,
+        description="A dictionary with ticket status as keys and the count of tickets as values",
+    )
 
 
 class StatsResponse(BaseModel):
@@ -518,71 +1452,128 @@ class StatsResponse(BaseModel):
     end_date: str = Field(
         ..., description="The end date of the data range in ISO format"
     )
+    tickets_by_day: list[DailyTicketStats] | None = Field(
+        None,
+        description="Number of tickets created each day of the data range, "
+        "only returned if `series` is true",
+    )
 
 
 @api_v1_router.get("/stats")
 def get_stats(
     n_days: int = 31,
+    series: bool = False,
     _: Any = Depends(get_auth_dependency(UserStatus.isModerator)),
 ) -> StatsResponse:
     """Get number of tickets by status for the last n days.
 
+    Statistics are read from the daily ticket statistics, so the data range
+    starts at the beginning (UTC) of its first day.
+
     Args:
         n_days (int): The number of days from which to fetch ticket data.
         Default is 31 days.
+        series (bool): Whether to return the number of tickets created each
+        day. Default is False.
     """
+    end_date = datetime.now(timezone.utc)
+    start_date = end_date - timedelta(days=n_days)
+    # The data range changes with its first day
+    cache_key = response_cache.key(
+        "get_stats", n_days=n_days, series=series, start_day=start_date.date()
+    )
     with db:
+        version = get_version()
+        cached = response_cache.get("get_stats", cache_key, version)
+        if cached is not None:
+            return cached
         # Return the total number of tickets
-        total_tickets = TicketModel.select().count()
-
-        # Get the total number of tickets created in the last n days
-        start_date = datetime.now(timezone.utc) - timedelta(days=n_days)
-        # Query for getting the count of tickets by status in the last n days
-        tickets = (
-            TicketModel.select(
-                TicketModel.status, fn.COUNT(TicketModel.id).alias("count")
-            )
-            .where(TicketModel.created_at >= start_date)
-            .group_by(TicketModel.status)
-        )
-        # Idem group by flavor
-        tickets_by_flavor = (
-            TicketModel.select(
-                TicketModel.flavor, fn.COUNT(TicketModel.id).alias("count")
-            )
-            .where(TicketModel.created_at >= start_date)
-            .group_by(TicketModel.flavor)
+        total_tickets = (
+            TicketDailyStatsModel.select(
+                fn.SUM(TicketDailyStatsModel.n_tickets)
+            ).scalar()
+            or 0
         )
-        # Idem group by type
-        tickets_by_type = (
-            TicketModel.select(
-                TicketModel.type, fn.COUNT(TicketModel.id).alias("count")
+        # Get the number of tickets created in the last n days, by day,
+        # status, flavor and type: there are only a few rows per day
+        daily_stats = list(
+            TicketDailyStatsModel.select().where(
+                TicketDailyStatsModel.day >= start_date.date(),
+                TicketDailyStatsModel.n_tickets != 0,
             )
-            .where(TicketModel.created_at >= start_date)
-            .group_by(TicketModel.type)
         )
 
+    tickets_by_status: dict[str, int] = defaultdict(int)
+    tickets_by_flavor: dict[str, int] = defaultdict(int)
+    tickets_by_type: dict[str, int] = defaultdict(int)
+    tickets_by_day: dict[date, dict[str, int]] = defaultdict(dict)
+    for stats in daily_stats:
+        tickets_by_status[stats.status] += stats.n_tickets
+        tickets_by_flavor[stats.flavor] += stats.n_tickets
+        tickets_by_type[stats.type] += stats.n_tickets
+        by_status = tickets_by_day[stats.day]
+        by_status[stats.status] = by_status.get(stats.status, 0) + stats.n_tickets
+
     # Prepare the results
     result = StatsResponse(
         total_tickets=total_tickets,
-        tickets_by_status={ticket.status: ticket.count for ticket in tickets},
-        tickets_by_flavor={ticket.flavor: ticket.count for ticket in tickets_by_flavor},
-        tickets_by_type={ticket.type: ticket.count for ticket in tickets_by_type},
+        tickets_by_status=tickets_by_status,
+        tickets_by_flavor=tickets_by_flavor,
+        tickets_by_type=tickets_by_type,
         n_days=n_days,
         start_date=start_date.isoformat(),
-        end_date=datetime.now(timezone.utc).isoformat(),
+        end_date=end_date.isoformat(),
     )
-    return result
+    if series:
+        # Days without tickets are included, with a count of 0
+        result.tickets_by_day = []
+        day = start_date.date()
+        while day <= end_date.date():
+            result.tickets_by_day.append(
+                DailyTicketStats(
+                    day=day,
+                    n_tickets=sum(tickets_by_day[day].values()),
+                    tickets_by_status=tickets_by_day[day],
+                )
+            )
+            day += timedelta(days=1)
+    return response_cache.set("get_stats", cache_key, version, result)
 
 
 class StatusResponse(BaseModel):
     status: str = Field(..., description="Health status of the API")
+    db_pool: PoolStats | None = Field(
+        None,
+        description="Statistics of the database connection pool of the worker "
+        "that handled the request, null if connection pooling is disabled",
+    )
+    async_db_pool: PoolStats = Field(
+        ...,
+        description="Statistics of the async database connection pool of the "
+        "worker that handled the request",
+    )
+    auth_client: AuthClientStats = Field(
+        ...,
+        description="Statistics of the calls to the auth server of the worker "
+        "that handled the request",
+    )
+    session_cache: SessionCacheStats = Field(
+        ...,
+        description="Statistics of the session cache of the worker that "
+        "handled the request",
+    )
 
 
 @api_v1_router.get("/status")
 def status() -> StatusResponse:
     """Health check endpoint."""
-    return StatusResponse(status="ok")
+    return StatusResponse(
+        status="ok",
+        db_pool=get_pool_stats(),
+        async_db_pool=async_db.pool_stats(),
+        auth_client=auth_client.stats(),
+        session_cache=session_cache.stats(),
+    )
 
 
 # Route only available in dev mode
@@ -0,0 +1,139 @@
+"""Archival of closed tickets.
+
+Closed tickets without activity for a while are moved out of the database,
+with their flags and moderator actions, into gzip-compressed JSONL files (one
+file per table and per archival run). The tables, and their indexes, then
+only hold the tickets the API works on.
+
+An archived ticket is not reopened by new flags: a new ticket is created
+instead. Archived tickets are removed from the daily ticket statistics in
+the same transaction, so that the statistics only count the tickets of the
+database, as when they are rebuilt (see `app.stats.rebuild_ticket_stats`).
+"""
+
+import gzip
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from .models import FlagModel, ModeratorActionModel, TicketModel, db
+from .stats import TicketStatsDelta
+from .utils import json_default
+
+
+class ArchiveResult(NamedTuple):
+    # Number of rows archived, by table
+    tickets: int
+    flags: int
+    moderator_actions: int
+    # Archive files, empty if nothing was archived (or in dry run mode)
+    paths: list[Path]
+
+
+def _archivable_tickets(older_than: datetime):
+    """Return the query selecting the closed tickets that were created and
+    last flagged before `older_than`."""
+    return TicketModel.select().where(
+        TicketModel.status == "closed",
+        TicketModel.created_at < older_than,
+        TicketModel.last_flagged_at.is_null()
+        | (TicketModel.last_flagged_at < older_than),
+    )
+
+
+def _write_rows(file, query) -> int:
+    n_rows = 0
+    for row in query.dicts().iterator():
+        file.write(json.dumps(row, default=json_default) + "\n")
+        n_rows += 1
+    return n_rows
+
+
+def archive_closed_tickets(
+    older_than: datetime,
+    output_dir: Path,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> ArchiveResult:
+    """Archive the closed tickets that were created and last flagged before
+    `older_than` (a naive UTC datetime) into `output_dir`, and delete them.
+
+    Tickets are processed by batches of `batch_size`, each batch being a
+    transaction, during which the tickets are locked so that they cannot be
+    reopened. Rows are written to the archive files before being deleted, so
+    an interrupted run never loses data (but the last batch may be archived
+    again by the next run).
+
+    If `dry_run` is True, only the rows that would be archived are counted.
+    """
+    tickets = _archivable_tickets(older_than)
+    if dry_run:
+        with db.atomic():
+            ticket_ids = tickets.select(TicketModel.id)
+            return ArchiveResult(
+                tickets.count(),
+                FlagModel.select().where(FlagModel.ticket.in_(ticket_ids)).count(),
+                ModeratorActionModel.select()
+                .where(ModeratorActionModel.ticket.in_(ticket_ids))
+                .count(),
+                [],
+            )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    tables = (TicketModel, FlagModel, ModeratorActionModel)
+    paths = [
+        output_dir / f"{model._meta.table_name}-{run_id}.jsonl.gz" for model in tables
+    ]
+    counts = [0, 0, 0]
+    files = [gzip.open(path, "wt", encoding="utf-8") for path in paths]
+    try:
+        last_id = 0
+        while True:
+            with db.atomic():
+                batch = list(
+                    tickets.select(
+                        TicketModel.id,
+                        TicketModel.created_at,
+                        TicketModel.status,
+                        TicketModel.flavor,
+                        TicketModel.type,
+                    )
+                    .where(TicketModel.id > last_id)
+                    .order_by(TicketModel.id)
+                    .limit(batch_size)
+                    .for_update()
+                )
+                if not batch:
+                    break
+                ticket_ids = [ticket.id for ticket in batch]
+                queries = [
+                    TicketModel.select().where(TicketModel.id.in_(ticket_ids)),
+                    FlagModel.select().where(FlagModel.ticket.in_(ticket_ids)),
+                    ModeratorActionModel.select().where(
+                        ModeratorActionModel.ticket.in_(ticket_ids)
+                    ),
+                ]
+                for i, (file, query) in enumerate(zip(files, queries)):
+                    counts[i] += _write_rows(file, query.order_by(query.model.id))
+                    file.flush()
+                ModeratorActionModel.delete().where(
+                    ModeratorActionModel.ticket.in_(ticket_ids)
+                ).execute()
+                FlagModel.delete().where(FlagModel.ticket.in_(ticket_ids)).execute()
+                TicketModel.delete().where(TicketModel.id.in_(ticket_ids)).execute()
+                stats_delta = TicketStatsDelta()
+                for ticket in batch:
+                    stats_delta.add(ticket, count=-1)
+                stats_delta.apply()
+            last_id = ticket_ids[-1]
+    finally:
+        for file in files:
+            file.close()
+
+    if not counts[0]:
+        for path in paths:
+            path.unlink()
+        paths = []
+    return ArchiveResult(*counts, paths)
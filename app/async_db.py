@@ -0,0 +1,180 @@
+"""Async access to the database, for the request hot paths.
+
+Queries are built with peewee, as everywhere else in the app, compiled to SQL
+with the Postgres dialect and executed on a pool of psycopg (v3) async
+connections. Results go through the same peewee cursor wrappers as the sync
+path (model instances, `.dicts()`, `.tuples()`...), so the query semantics
+are the same.
+"""
+
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncIterator
+
+from peewee import BaseQuery
+from psycopg import AsyncClientCursor, AsyncConnection
+from psycopg_pool import AsyncConnectionPool
+
+from .database import PoolStats
+from .metrics import observe_connection_wait
+from .profiling import profile_query
+
+Query = BaseQuery | str
+
+
+class _BufferedCursor:
+    """Minimal DB-API cursor over rows that were already fetched, used to
+    feed peewee cursor wrappers."""
+
+    def __init__(self, description, rows: list[tuple]):
+        self.description = description
+        self._rows = iter(rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def close(self):
+        pass
+
+
+def _compile(query: Query, params: tuple | list | None = None) -> tuple[str, list]:
+    if isinstance(query, str):
+        sql, params = query, params or ()
+    else:
+        sql, params = query.sql()
+    return sql, [_adapt(p) for p in params]
+
+
+def _adapt(param: Any) -> Any:
+    # Enums are sent as their value, as with psycopg2, including in arrays
+    if isinstance(param, Enum):
+        return param.value
+    if isinstance(param, list):
+        return [_adapt(p) for p in param]
+    return param
+
+
+async def _execute(cursor, sql: str, params: list | None = None):
+    with profile_query("async", sql, params):
+        await cursor.execute(sql, params)
+
+
+class AsyncSession:
+    """Execute peewee queries on an async connection."""
+
+    def __init__(self, conn: AsyncConnection):
+        self.conn = conn
+
+    async def execute(self, query: Query, params: tuple | list | None = None) -> int:
+        """Execute the query and return the number of affected rows."""
+        sql, params = _compile(query, params)
+        async with self.conn.cursor() as cursor:
+            await _execute(cursor, sql, params)
+            return cursor.rowcount
+
+    async def fetchall(
+        self, query: Query, params: tuple | list | None = None
+    ) -> list[Any]:
+        """Execute the query and return all rows.
+
+        Rows are converted by peewee (model instances by default, or dicts,
+        tuples... depending on the query row type). Raw SQL queries return
+        tuples.
+        """
+        sql, params = _compile(query, params)
+        async with self.conn.cursor() as cursor:
+            await _execute(cursor, sql, params)
+            rows = await cursor.fetchall() if cursor.description else []
+            description = cursor.description
+        if isinstance(query, str):
+            return rows
+        return list(query._get_cursor_wrapper(_BufferedCursor(description, rows)))
+
+    async def fetchone(
+        self, query: Query, params: tuple | list | None = None
+    ) -> Any | None:
+        """Execute the query and return the first row, or None."""
+        rows = await self.fetchall(query, params)
+        return rows[0] if rows else None
+
+    async def iter_batches(
+        self, query: Query, batch_size: int, params: tuple | list | None = None
+    ) -> AsyncIterator[list[Any]]:
+        """Execute the query with a server-side cursor, and yield the rows by
+        batches of `batch_size`, so that the result set is never fully loaded
+        in memory. Rows are converted as in `fetchall`.
+
+        The session must not be used for other queries while iterating.
+        """
+        sql, params = _compile(query, params)
+        async with self.conn.cursor() as client_cursor:
+            # Server-side cursors bind parameters server-side, interpolate
+            # them client-side first
+            sql = client_cursor.mogrify(sql, params)
+        async with self.conn.cursor(name=f"batches_{id(self)}") as cursor:
+            await _execute(cursor, sql)
+            while rows := await cursor.fetchmany(batch_size):
+                if isinstance(query, str):
+                    yield rows
+                else:
+                    yield list(
+                        query._get_cursor_wrapper(
+                            _BufferedCursor(cursor.description, rows)
+                        )
+                    )
+
+    async def scalar(self, query: Query, params: tuple | list | None = None) -> Any:
+        """Execute the query and return the first column of the first row."""
+        sql, params = _compile(query, params)
+        async with self.conn.cursor() as cursor:
+            await _execute(cursor, sql, params)
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+
+class AsyncDatabase:
+    """A pool of async Postgres connections."""
+
+    def __init__(self, conninfo: str, **pool_kwargs):
+        self.conninfo = conninfo
+        # Parameters are bound client-side, as with psycopg2: peewee relies
+        # on it for some constructs (e.g. `IS %s` with a None parameter)
+        self._pool = AsyncConnectionPool(
+            conninfo,
+            open=False,
+            kwargs={"cursor_factory": AsyncClientCursor},
+            **pool_kwargs,
+        )
+
+    async def open(self):
+        await self._pool.open()
+
+    async def close(self):
+        await self._pool.close()
+
+    @asynccontextmanager
+    async def atomic(self, rollback: bool = False) -> AsyncIterator[AsyncSession]:
+        """Check out a connection and run the block in a transaction, the
+        async equivalent of `with db:`.
+
+        The transaction is rolled back instead of committed if `rollback` is
+        True.
+        """
+        start = time.perf_counter()
+        async with self._pool.connection() as conn:
+            observe_connection_wait("async", time.perf_counter() - start)
+            async with conn.transaction(force_rollback=rollback):
+                yield AsyncSession(conn)
+
+    def pool_stats(self) -> PoolStats:
+        """Return the current pool statistics."""
+        stats = self._pool.get_stats()
+        return PoolStats(
+            in_use=stats["pool_size"] - stats["pool_available"],
+            idle=stats["pool_available"],
+            waiting=stats.get("requests_waiting", 0),
+            created=stats.get("connections_num", 0),
+            min_size=stats["pool_min"],
+            max_size=stats["pool_max"],
+        )
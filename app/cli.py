@@ -1,5 +1,11 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
 import typer
 
+from app.export import ExportCompression, ExportFormat, ExportTable
+
 app = typer.Typer()
 
 
@@ -31,5 +37,193 @@ def add_revision(
         add_revision(name)
 
 
+@app.command()
+def rebuild_stats():
+    """Rebuild the daily ticket statistics from the tickets."""
+    from openfoodfacts.utils import get_logger
+
+    from app.models import db
+    from app.response_cache import invalidate
+    from app.stats import rebuild_ticket_stats
+
+    logger = get_logger()
+
+    with db.connection_context():
+        n_rows = rebuild_ticket_stats()
+        invalidate()
+    logger.info("Daily ticket statistics rebuilt: %d rows", n_rows)
+
+
+@app.command()
+def backfill_ticket_aggregates(
+    batch_size: int = typer.Option(1000, help="Number of tickets per transaction"),
+):
+    """Recompute the flag aggregates of all tickets (number of flags, reasons,
+    sources...) from the flags."""
+    from openfoodfacts.utils import get_logger
+
+    from app import ticket_aggregates
+    from app.models import db
+    from app.response_cache import invalidate
+
+    logger = get_logger()
+
+    with db.connection_context():
+        n_updated = ticket_aggregates.backfill(batch_size)
+        invalidate()
+    logger.info("Flag aggregates recomputed for %d tickets", n_updated)
+
+
+@app.command()
+def archive_tickets(
+    older_than_days: int = typer.Option(
+        365, help="Archive closed tickets without activity for this many days"
+    ),
+    output_dir: Path = typer.Option(
+        Path("archives"), help="Directory where archive files are written"
+    ),
+    batch_size: int = typer.Option(1000, help="Number of tickets per transaction"),
+    dry_run: bool = typer.Option(
+        False, help="Only report what would be archived, without changing anything"
+    ),
+):
+    """Move closed tickets, with their flags and moderator actions, from the
+    database to compressed JSONL files."""
+    from openfoodfacts.utils import get_logger
+
+    from app.archive import archive_closed_tickets
+    from app.models import db
+    from app.response_cache import invalidate
+
+    logger = get_logger()
+
+    older_than = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+        days=older_than_days
+    )
+    with db.connection_context():
+        result = archive_closed_tickets(older_than, output_dir, batch_size, dry_run)
+        if not dry_run:
+            invalidate()
+    logger.info(
+        "%s%d tickets, %d flags and %d moderator actions archived%s",
+        "[dry run] " if dry_run else "",
+        result.tickets,
+        result.flags,
+        result.moderator_actions,
+        f" to {', '.join(str(path) for path in result.paths)}" if result.paths else "",
+    )
+
+
+@app.command()
+def export(
+    table: ExportTable = typer.Argument(..., help="Table to export"),
+    output: Path = typer.Argument(..., help="Path of the export file"),
+    output_format: ExportFormat = typer.Option(
+        ExportFormat.csv, "--format", help="Export format"
+    ),
+    compression: ExportCompression = typer.Option(
+        ExportCompression.none, help="Compression of the export"
+    ),
+    since: Optional[datetime] = typer.Option(
+        None, help="Only export rows created at or after this UTC date"
+    ),
+    until: Optional[datetime] = typer.Option(
+        None, help="Only export rows created before this UTC date"
+    ),
+    flavor: Optional[str] = typer.Option(None, help="Only export this flavor"),
+    status: Optional[str] = typer.Option(
+        None, help="Only export tickets with this status (or their flags/actions)"
+    ),
+    state_file: Optional[Path] = typer.Option(
+        None,
+        help="Export incrementally: only export the rows added since the "
+        "previous export, whose high-water mark is stored in this JSON file",
+    ),
+):
+    """Export tickets, flags or moderator actions, streamed from the
+    database."""
+    from openfoodfacts.utils import get_logger
+
+    from app.export import (
+        ExportFilters,
+        export,
+        load_high_water_marks,
+        save_high_water_marks,
+    )
+    from app.models import db
+
+    logger = get_logger()
+
+    marks = load_high_water_marks(state_file) if state_file else {}
+    with db.connection_context():
+        result = export(
+            table,
+            output,
+            output_format,
+            compression,
+            ExportFilters(since, until, flavor, status),
+            after_id=marks.get(table, 0) if state_file else None,
+        )
+    if state_file:
+        marks[table] = result.last_id
+        save_high_water_marks(state_file, marks)
+    logger.info("%d %s exported to %s", result.rows, table, output)
+
+
+@app.command()
+def seed(
+    tickets: int = typer.Option(100000, help="Number of tickets to generate"),
+    flags: int = typer.Option(
+        300000, help="Number of flags to generate, at least one per ticket"
+    ),
+    seed: int = typer.Option(0, help="Seed of the random generator"),
+    end: Optional[datetime] = typer.Option(
+        None,
+        help="Tickets are created before this UTC date (the beginning of the "
+        "current day by default), set it for reproducible dates",
+    ),
+    days: int = typer.Option(365, help="Tickets are created over this many days"),
+    closed_ratio: float = typer.Option(0.8, help="Ratio of closed tickets"),
+    robotoff_ratio: float = typer.Option(
+        0.2, help="Ratio of tickets with a flag from Robotoff"
+    ),
+    zipf_exponent: float = typer.Option(
+        1.0, help="Exponent of the Zipf distributions of flags and products"
+    ),
+    users: int = typer.Option(100000, help="Number of distinct flaggers"),
+    max_flags_per_ticket: int = typer.Option(
+        1000, help="Maximum number of flags of a ticket"
+    ),
+    batch_size: int = typer.Option(10000, help="Number of tickets per transaction"),
+):
+    """Fill the database with a synthetic dataset of tickets and flags."""
+    from openfoodfacts.utils import get_logger
+
+    from app.models import db
+    from app.response_cache import invalidate
+    from app.seed import SeedParameters
+    from app.seed import seed as seed_database
+
+    logger = get_logger()
+
+    params = SeedParameters(
+        tickets,
+        flags,
+        seed,
+        end,
+        days,
+        closed_ratio,
+        robotoff_ratio,
+        zipf_exponent,
+        users,
+        max_flags_per_ticket,
+        batch_size,
+    )
+    with db.connection_context():
+        n_tickets, n_flags = seed_database(params)
+        invalidate()
+    logger.info("%d tickets and %d flags created", n_tickets, n_flags)
+
+
 def main() -> None:
     app()
@@ -33,12 +33,90 @@ class LoggingLevel(StrEnum):
 
 class Settings(BaseSettings):
     sentry_dns: str | None = None
+    # Fraction of the requests traced in Sentry (performance monitoring)
+    sentry_traces_sample_rate: float = 0
     log_level: LoggingLevel = LoggingLevel.INFO
     postgres_host: str = "localhost"
     postgres_db: str = "postgres"
     postgres_user: str = "postgres"
     postgres_password: str = "postgres"
     postgres_port: int = 5432
+    # Connection pool settings, the pool is per process (uvicorn worker)
+    postgres_pool_enabled: bool = True
+    postgres_pool_min_size: int = 1
+    postgres_pool_max_size: int = 10
+    # Maximum time (in seconds) to wait for a connection to be released
+    # when the pool is exhausted
+    postgres_pool_timeout: float = 10
+    # Idle connections are closed after this delay (in seconds)
+    postgres_pool_idle_timeout: float = 300
+    # Connections are recycled after this delay (in seconds)
+    postgres_pool_recycle: float = 3600
+    # Number of rows fetched at a time when streaming flags
+    flags_stream_batch_size: int = 1000
+    # Maximum number of flags in a single bulk creation request
+    flags_bulk_max_size: int = 10000
+    # HTTP client used to call the auth server, shared by all requests of a
+    # process (uvicorn worker)
+    auth_http2: bool = True
+    auth_max_connections: int = 100
+    auth_max_keepalive_connections: int = 20
+    # Idle keep-alive connections are closed after this delay (in seconds)
+    auth_keepalive_expiry: float = 30
+    # Timeouts (in seconds) of auth server requests
+    auth_timeout: float = 10
+    auth_connect_timeout: float = 5
+    # The auth server is not called for `auth_circuit_reset_timeout` seconds
+    # after this number of consecutive failures
+    auth_circuit_failure_threshold: int = 5
+    auth_circuit_reset_timeout: float = 30
+    # Cache of the user data returned by the auth server, by session: a
+    # bounded in-process cache per worker, and an optional cache shared by
+    # all workers (Redis-compatible store URL, e.g. redis://localhost:6379/0)
+    session_cache_max_size: int = 10000
+    # Time to live (in seconds) of valid and invalid sessions
+    session_cache_ttl: float = 3600
+    session_cache_negative_ttl: float = 60
+    # Expired valid sessions are still served during this time (in seconds),
+    # while they are refreshed in the background
+    session_cache_stale_ttl: float = 300
+    session_cache_redis_url: str | None = None
+    # Timeout (in seconds) of shared cache calls, the cache is skipped on
+    # timeout
+    session_cache_redis_timeout: float = 0.5
+    # Duration (in seconds) of the claim of a ticket by a moderator
+    ticket_claim_lease: float = 900
+    # Cache of the responses of the moderator read endpoints, see
+    # app/response_cache.py: maximum number of responses cached by each
+    # process, and maximum time (in seconds) a response is cached, by route
+    response_cache_enabled: bool = True
+    response_cache_max_size: int = 1000
+    response_cache_ttl: dict[str, float] = {
+        "get_tickets": 30,
+        "get_ticket": 60,
+        "get_flags_by_ticket_batch": 60,
+        "get_stats": 300,
+    }
+    # Streams of ticket events, see app/ticket_events.py: number of recent
+    # events kept by each process to resume streams, and maximum number of
+    # events waiting to be sent to a client (its stream is closed beyond it)
+    ticket_events_buffer_size: int = 10000
+    ticket_events_queue_size: int = 1000
+    # Interval (in seconds) of the keep-alive messages of the streams
+    ticket_events_heartbeat: float = 15
+    # Streams are closed after this duration (in seconds), clients reconnect
+    # and resume them
+    ticket_events_max_duration: float = 600
+    # Profiling of the database queries of each request, see app/profiling.py.
+    # Requests with at least this number of queries, or this database time
+    # (in seconds), are logged
+    query_profiling_enabled: bool = False
+    query_profiling_request_max_queries: int = 50
+    query_profiling_request_max_db_time: float = 0.5
+    # Statements of the logged requests taking at least this time (in
+    # seconds) are slow, this fraction of them are explained
+    query_profiling_slow_query_time: float = 0.1
+    query_profiling_explain_rate: float = 0.1
     cors_allow_origins: list[str] = Field(default_factory=list)
     off_tld: Environment = Environment.net
     environment: str = "dev"
@@ -0,0 +1,171 @@
+import heapq
+import threading
+import time
+
+from peewee import PostgresqlDatabase
+from playhouse.pool import (
+    MaxConnectionsExceeded,
+    PooledDatabase,
+    PooledPostgresqlDatabase,
+)
+from pydantic import BaseModel, Field
+
+from .metrics import observe_connection_wait
+from .profiling import profile_query
+
+
+class PoolStats(BaseModel):
+    """Runtime statistics of a connection pool."""
+
+    in_use: int = Field(..., description="Number of connections checked out")
+    idle: int = Field(..., description="Number of open connections in the pool")
+    waiting: int = Field(
+        ..., description="Number of callers waiting for a connection to be free"
+    )
+    created: int = Field(
+        ..., description="Number of connections opened since the pool started"
+    )
+    min_size: int = Field(..., description="Minimum number of connections kept")
+    max_size: int = Field(..., description="Maximum number of connections")
+
+
+class InstrumentedDatabaseMixin:
+    """Record the duration of the queries in the Prometheus metrics, and in
+    the profile of the request (see `app.profiling`)."""
+
+    def execute_sql(self, sql, params=None, commit=None):
+        with profile_query("sync", sql, params):
+            return super().execute_sql(sql, params, commit)
+
+
+class InstrumentedPostgresqlDatabase(InstrumentedDatabaseMixin, PostgresqlDatabase):
+    pass
+
+
+class ManagedPooledPostgresqlDatabase(
+    InstrumentedDatabaseMixin, PooledPostgresqlDatabase
+):
+    """A pooled Postgres database with a minimum size, idle timeout and
+    runtime statistics.
+
+    On top of peewee's pool (max size, stale connection recycling and wait
+    timeout), connections that stayed idle in the pool for more than
+    `idle_timeout` seconds are closed, as long as at least `min_connections`
+    connections remain open.
+    """
+
+    def __init__(
+        self,
+        database,
+        min_connections: int = 0,
+        idle_timeout: float | None = None,
+        **kwargs,
+    ):
+        self._min_connections = min_connections
+        self._idle_timeout = idle_timeout
+        # time at which each idle connection was returned to the pool
+        self._idle_since: dict[int, float] = {}
+        self._stats_lock = threading.Lock()
+        self._waiting = 0
+        self._created = 0
+        super().__init__(database, **kwargs)
+
+    def connect(self, reuse_if_open=False):
+        start = time.perf_counter()
+        opened = self._connect_or_wait(reuse_if_open)
+        if opened:
+            # Not recorded when the connection of the thread is reused
+            observe_connection_wait("sync", time.perf_counter() - start)
+        return opened
+
+    def _connect_or_wait(self, reuse_if_open: bool) -> bool:
+        try:
+            # First attempt, without waiting for a connection to be released
+            return super(PooledDatabase, self).connect(reuse_if_open)
+        except MaxConnectionsExceeded:
+            if not self._wait_timeout:
+                raise
+
+        with self._stats_lock:
+            self._waiting += 1
+        try:
+            return super().connect(reuse_if_open)
+        finally:
+            with self._stats_lock:
+                self._waiting -= 1
+
+    def _connect(self):
+        # Called with `self._lock` held
+        self._close_idle_expired()
+        # Keep a reference to idle connections, so that their id cannot be
+        # reused by a new connection while we check whether one was created
+        idle_connections = [entry[-1] for entry in self._connections]
+        idle_keys = {self.conn_key(conn) for conn in idle_connections}
+        conn = super()._connect()
+        key = self.conn_key(conn)
+        if key not in idle_keys:
+            self._created += 1
+        self._idle_since.pop(key, None)
+        return conn
+
+    def _close(self, conn, close_conn=False):
+        n_idle = len(self._connections)
+        super()._close(conn, close_conn)
+        if len(self._connections) > n_idle:
+            # The connection was returned to the pool
+            self._idle_since[self.conn_key(conn)] = time.time()
+        else:
+            self._idle_since.pop(self.conn_key(conn), None)
+
+    def _close_idle_expired(self):
+        """Close connections that have been idle for more than
+        `idle_timeout` seconds, keeping at least `min_connections` open."""
+        if not self._idle_timeout or not self._connections:
+            return
+        n_open = len(self._connections) + len(self._in_use)
+        cutoff = time.time() - self._idle_timeout
+        kept = []
+        for entry in sorted(self._connections, key=self._idle_sort_key):
+            conn = entry[-1]
+            key = self.conn_key(conn)
+            if n_open > self._min_connections and self._idle_since.get(key, 0) < cutoff:
+                self._idle_since.pop(key, None)
+                self._close(conn, close_conn=True)
+                n_open -= 1
+            else:
+                kept.append(entry)
+        heapq.heapify(kept)
+        self._connections = kept
+
+    def _idle_sort_key(self, entry) -> float:
+        # Longest idle connections first
+        return self._idle_since.get(self.conn_key(entry[-1]), 0)
+
+    def warm_up(self) -> int:
+        """Open connections until the pool holds at least `min_connections`
+        connections.
+
+        Return the number of connections opened.
+        """
+        opened = 0
+        with self._lock:
+            while len(self._connections) + len(self._in_use) < self._min_connections:
+                conn = PostgresqlDatabase._connect(self)
+                self._created += 1
+                self._idle_since[self.conn_key(conn)] = time.time()
+                heapq.heappush(self._connections, (time.time(), conn))
+                opened += 1
+        return opened
+
+    def pool_stats(self) -> PoolStats:
+        """Return the current pool statistics."""
+        with self._stats_lock:
+            waiting = self._waiting
+        return PoolStats(
+            in_use=len(self._in_use),
+            idle=len(self._connections),
+            waiting=waiting,
+            created=self._created,
+            min_size=self._min_connections,
+            max_size=self._max_connections or 0,
+        )
@@ -0,0 +1,52 @@
+"""ETags of the ticket endpoints, for conditional requests.
+
+Clients polling the tickets send the ETag of the last response they got in
+the If-None-Match header, and get an empty 304 response if the data did not
+change, without the rows being loaded or serialized.
+
+ETags are computed from the `updated_at` column of tickets, updated by the
+database on each change of a ticket, including the aggregates of its flags
+(see migration 010):
+
+- the ETag of a ticket is derived from its last update date,
+- the ETag of a listing is derived from the query parameters, and from the
+  number of tickets matching the filters, their last update date and the sum
+  of their update dates. The sum changes when any of the tickets is updated,
+  even if its update was committed after the last one.
+
+These aggregates read all the tickets matching the filters, as a count does.
+Listings requested without an exact count use the version of the response
+cache instead (see `app.response_cache`), which changes with any write.
+"""
+
+import hashlib
+import json
+
+from fastapi.responses import Response
+
+
+def make_etag(*parts) -> str:
+    """Return a strong ETag derived from the parts, which must be JSON
+    serializable (or convertible to a string)."""
+    digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Return True if the If-None-Match header matches the ETag.
+
+    As required for If-None-Match, weak ETags (W/"...") match the strong
+    ETags with the same value.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    """Return the 304 response of the resource with this ETag."""
+    return Response(status_code=304, headers={"ETag": etag})
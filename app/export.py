@@ -0,0 +1,251 @@
+"""Bulk export of tickets, flags and moderator actions.
+
+Rows are streamed from PostgreSQL to the export file, so that the memory
+usage does not depend on the size of the export: CSV and JSONL exports are
+produced by PostgreSQL itself (with `COPY ... TO STDOUT`), Parquet exports
+are written by batches read with a server-side cursor.
+
+Exports can be incremental: only the rows added since the previous export
+are exported, see `export`.
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+from enum import StrEnum, auto
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+from uuid import UUID
+
+from peewee import SQL, Model, ModelSelect, fn
+from playhouse.postgres_ext import ArrayField
+
+from .models import FlagModel, ModeratorActionModel, TicketModel, db
+
+# Rows are read by batches of this size for Parquet exports
+PARQUET_BATCH_SIZE = 10000
+
+# Rows inserted less than this time before an incremental export may have
+# been inserted by transactions that were not committed yet, with lower IDs:
+# the high-water mark is not moved past them, so that they are exported
+# again (with the missed rows, if any) by the next export. The insertion date
+# is set by the database (`inserted_at`), as the creation date may be given
+# by clients
+INCREMENTAL_SETTLE_TIME = timedelta(minutes=1)
+
+
+class ExportTable(StrEnum):
+    tickets = auto()
+    flags = auto()
+    moderator_actions = auto()
+
+
+class ExportFormat(StrEnum):
+    csv = auto()
+    jsonl = auto()
+    parquet = auto()
+
+
+class ExportCompression(StrEnum):
+    none = auto()
+    gzip = auto()
+    zstd = auto()
+
+
+class ExportFilters(NamedTuple):
+    # Creation date range, as naive UTC datetimes (`until` is excluded)
+    since: datetime | None = None
+    until: datetime | None = None
+    flavor: str | None = None
+    # Status of the ticket, for flags and moderator actions the status of
+    # their ticket
+    status: str | None = None
+
+
+class ExportResult(NamedTuple):
+    # Number of exported rows
+    rows: int
+    # High-water mark to start the next incremental export from, None if the
+    # export is not incremental
+    last_id: int | None
+
+
+_MODELS: dict[ExportTable, type[Model]] = {
+    ExportTable.tickets: TicketModel,
+    ExportTable.flags: FlagModel,
+    ExportTable.moderator_actions: ModeratorActionModel,
+}
+
+
+def _export_query(
+    model: type[Model], filters: ExportFilters, after_id: int | None
+) -> ModelSelect:
+    query = model.select().order_by(model.id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if filters.since is not None:
+        query = query.where(model.created_at >= filters.since)
+    if filters.until is not None:
+        query = query.where(model.created_at < filters.until)
+
+    ticket_conditions = []
+    if filters.flavor is not None:
+        if model is ModeratorActionModel:
+            ticket_conditions.append(TicketModel.flavor == filters.flavor)
+        else:
+            query = query.where(model.flavor == filters.flavor)
+    if filters.status is not None:
+        ticket_conditions.append(TicketModel.status == filters.status)
+    if ticket_conditions:
+        if model is TicketModel:
+            query = query.where(*ticket_conditions)
+        else:
+            query = query.where(
+                model.ticket.in_(
+                    TicketModel.select(TicketModel.id).where(*ticket_conditions)
+                )
+            )
+    return query
+
+
+def _open_output(path: Path, compression: ExportCompression) -> BinaryIO:
+    if compression is ExportCompression.gzip:
+        return gzip.open(path, "wb")  # type: ignore[return-value]
+    if compression is ExportCompression.zstd:
+        # Only required for zstd-compressed exports
+        import zstandard
+
+        return zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+    return open(path, "wb")
+
+
+def _copy(query: ModelSelect, output_format: ExportFormat, file: BinaryIO) -> int:
+    """Write the rows of the query to the file with COPY, and return the
+    number of rows."""
+    cursor = db.cursor()
+    # COPY does not support query parameters
+    sql = cursor.mogrify(*query.sql()).decode()
+    if output_format is ExportFormat.csv:
+        copy_sql = f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    else:
+        # JSON strings do not contain control characters (they are escaped),
+        # so using them as quote and delimiter characters writes the JSON
+        # objects unchanged
+        copy_sql = (
+            f"COPY (SELECT row_to_json(t) FROM ({sql}) AS t) TO STDOUT "
+            "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+        )
+    cursor.copy_expert(copy_sql, file)
+    return cursor.rowcount
+
+
+def _parquet_schema(model: type[Model]):
+    import pyarrow as pa
+
+    fields = []
+    for field in model._meta.sorted_fields:
+        if isinstance(field, ArrayField):
+            type_ = pa.list_(pa.string())
+        else:
+            type_ = {
+                "AUTO": pa.int64(),
+                "INT": pa.int64(),
+                "FLOAT": pa.float64(),
+                "DATE": pa.date32(),
+                "DATETIME": pa.timestamp("us"),
+            }.get(field.field_type, pa.string())
+        fields.append(pa.field(field.column_name, type_))
+    return pa.schema(fields)
+
+
+def _write_parquet(
+    query: ModelSelect, compression: ExportCompression, path: Path
+) -> int:
+    """Write the rows of the query to a Parquet file, by batches, and return
+    the number of rows."""
+    # Only required for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(query.model)
+    n_rows = 0
+    # Server-side cursor, rows are fetched by batches. It's declared in SQL
+    # as peewee connections are in autocommit mode for psycopg2, which then
+    # refuses to open named cursors
+    sql, params = query.sql()
+    cursor = db.cursor()
+    cursor.execute(f"DECLARE export_cursor NO SCROLL CURSOR FOR {sql}", params)
+    with pq.ParquetWriter(path, schema, compression=str(compression)) as writer:
+        while True:
+            cursor.execute(f"FETCH {PARQUET_BATCH_SIZE} FROM export_cursor")
+            if not (rows := cursor.fetchall()):
+                break
+            columns = [
+                [str(value) if isinstance(value, UUID) else value for value in column]
+                for column in zip(*rows)
+            ]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            n_rows += len(rows)
+    cursor.execute("CLOSE export_cursor")
+    return n_rows
+
+
+def export(
+    table: ExportTable,
+    path: Path,
+    output_format: ExportFormat = ExportFormat.csv,
+    compression: ExportCompression = ExportCompression.none,
+    filters: ExportFilters = ExportFilters(),
+    after_id: int | None = None,
+) -> ExportResult:
+    """Export the rows of a table matching the filters to `path`, in ID
+    order.
+
+    If `after_id` is not None, the export is incremental: only the rows with
+    a higher ID are exported, and the returned `last_id` is the ID to start
+    the next incremental export from. It's exact as long as the transactions
+    inserting rows last less than half of `INCREMENTAL_SETTLE_TIME`, rows
+    inserted less than `INCREMENTAL_SETTLE_TIME` before the export may be
+    exported again by the next export: consumers should deduplicate rows on
+    their ID.
+    """
+    model = _MODELS[table]
+    query = _export_query(model, filters, after_id)
+    # The high-water mark and the export must see the same rows
+    with db.atomic(isolation_level="REPEATABLE READ"):
+        last_id = None
+        if after_id is not None:
+            # Compared with the clock of the database, which sets the
+            # insertion dates
+            settled_before = SQL(
+                "(now() AT TIME ZONE 'UTC') - %s", (INCREMENTAL_SETTLE_TIME,)
+            )
+            last_id = (
+                query.select(fn.MAX(model.id))
+                .order_by()
+                .where(model.inserted_at < settled_before)
+                .scalar()
+            ) or after_id
+
+        if output_format is ExportFormat.parquet:
+            n_rows = _write_parquet(query, compression, path)
+        else:
+            with _open_output(path, compression) as file:
+                n_rows = _copy(query, output_format, file)
+    return ExportResult(n_rows, last_id)
+
+
+def load_high_water_marks(path: Path) -> dict[str, int]:
+    """Load the high-water marks of incremental exports (the ID to start the
+    next export from, by table) from a JSON file."""
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_high_water_marks(path: Path, marks: dict[str, int]):
+    # Written to a temporary file first, so that an interrupted write does
+    # not corrupt the marks
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(marks, indent=2))
+    tmp_path.replace(path)
@@ -0,0 +1,205 @@
+"""Prometheus metrics, served on /metrics.
+
+With several uvicorn workers, each worker has its own metrics: set the
+PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory, shared
+by the workers, so that /metrics aggregates the metrics of all workers
+(multiprocess mode of prometheus_client). The directory must be emptied
+before the server starts (e.g. a tmpfs, or a directory of the container).
+"""
+
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+if multiproc_dir := os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests, until the response is fully sent",
+    ["method", "route", "status"],
+)
+# Event streams (Server-Sent Events) last up to several minutes: they are not
+# included in the request metrics, which they would skew
+STREAM_DURATION = Histogram(
+    "http_stream_duration_seconds",
+    "Duration of HTTP event streams (text/event-stream responses)",
+    ["method", "route", "status"],
+    buckets=(1, 10, 30, 60, 120, 300, 600, 900, 1800, float("inf")),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Number of HTTP requests being processed",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Number of database queries of each HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries by each HTTP request",
+    ["route"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duration of database queries",
+    ["database"],
+)
+DB_CONNECTION_WAIT = Histogram(
+    "db_connection_wait_seconds",
+    "Time waited to get a connection from the pool",
+    ["database"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, float("inf")),
+)
+SESSION_CACHE_LOOKUPS = Counter(
+    "auth_session_cache_lookups",
+    "Lookups in the session cache, by result: hit (fresh), stale_hit, "
+    "negative_hit (invalid session) or miss",
+    ["result"],
+)
+AUTH_SERVER_DURATION = Histogram(
+    "auth_server_request_duration_seconds",
+    "Duration of the requests to the auth server, by HTTP status code (or "
+    "'error' if no response was received)",
+    ["status"],
+)
+AUTH_SERVER_REJECTIONS = Counter(
+    "auth_server_circuit_rejections",
+    "Requests to the auth server rejected because its circuit is open",
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "response_cache_lookups",
+    "Lookups in the response cache, by route and result (hit or miss)",
+    ["route", "result"],
+)
+TICKET_EVENT_SUBSCRIBERS = Gauge(
+    "ticket_event_subscribers",
+    "Number of open streams of ticket events",
+    multiprocess_mode="livesum",
+)
+TICKET_EVENT_OVERFLOWS = Counter(
+    "ticket_event_overflows",
+    "Streams of ticket events closed because the client did not keep up",
+)
+FLAGS_CREATED = Counter(
+    "flags_created", "Number of flags created", ["source", "flavor"]
+)
+
+
+class _RequestDBStats:
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+# Database statistics of the current request. The object is shared with the
+# threads running sync endpoints, as they get a copy of the context.
+_request_db_stats: ContextVar[_RequestDBStats | None] = ContextVar(
+    "request_db_stats", default=None
+)
+
+
+def observe_query(database: str, duration: float):
+    """Record a database query of `duration` seconds, on the `sync` or
+    `async` database."""
+    DB_QUERY_DURATION.labels(database).observe(duration)
+    if (stats := _request_db_stats.get()) is not None:
+        stats.queries += 1
+        stats.duration += duration
+
+
+def observe_connection_wait(database: str, duration: float):
+    DB_CONNECTION_WAIT.labels(database).observe(duration)
+
+
+def _route(scope: Scope) -> str:
+    """Return the path template of the route matching the request (e.g.
+    /api/v1/tickets/{ticket_id}), so that the number of label values is
+    bounded."""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match is not Match.NONE:
+            return route.path
+    return "unmatched"
+
+
+class PrometheusMiddleware:
+    """Record the duration, number of requests in progress and database
+    usage of HTTP requests, by route.
+
+    Only the duration of event streams is recorded, in a separate metric.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route(scope)
+        status = 500
+        is_stream = False
+        db_stats = _RequestDBStats()
+        token = _request_db_stats.set(db_stats)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status, is_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                is_stream = any(
+                    name.lower() == b"content-type"
+                    and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            _request_db_stats.reset(token)
+            if is_stream:
+                STREAM_DURATION.labels(method, route, str(status)).observe(duration)
+            else:
+                REQUEST_DURATION.labels(method, route, str(status)).observe(duration)
+                REQUEST_DB_QUERIES.labels(route).observe(db_stats.queries)
+                REQUEST_DB_DURATION.labels(route).observe(db_stats.duration)
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    """Return the metrics in the Prometheus text format, and its content
+    type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Remove the live gauges of the current worker, when it stops."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
@@ -6,7 +6,13 @@ from urllib.parse import urlparse, urlunparse
 
 import httpx
 from fastapi import HTTPException, Request
-from fastapi_cache.decorator import cache
+
+from app.config import settings
+from app.middleware.auth_client import CircuitOpenError, auth_client
+from app.middleware.session_cache import session_cache
+
+# User ID of requests authenticated with the Robotoff bearer token
+ROBOTOFF_USER_ID = "robotoff"
 
 
 class UserStatus(StrEnum):
@@ -14,14 +20,7 @@ class UserStatus(StrEnum):
     isLoggedIn = auto()
 
 
-def generate_cache_key(*args, **kwargs) -> str:
-    # Expecting session_cookie at position 0, auth_base_url at position 1
-    try:
-        session_cookie = args[0]
-        auth_base_url = args[1]
-    except IndexError:
-        raise ValueError("Missing required parameters for cache key (positional args)")
-
+def generate_cache_key(session_cookie: str, auth_base_url: str) -> str:
     key_raw = f"{auth_base_url}:{session_cookie}"
     return "user-data:" + hashlib.md5(key_raw.encode()).hexdigest()
 
@@ -67,7 +66,12 @@ def get_auth_dependency(user_status: UserStatus):
     return wrapper
 
 
-async def auth_dependency(request: Request, user_status: UserStatus):
+async def auth_dependency(request: Request, user_status: UserStatus) -> str:
+    """Check that the request is authenticated with the required status.
+
+    Return the ID of the user, `ROBOTOFF_USER_ID` for requests authenticated
+    with the Robotoff bearer token.
+    """
     # Check for bearer token in Authorization header
     # Currently, this is only for robotoff
     auth_header = request.headers.get("Authorization")
@@ -80,7 +84,7 @@ async def auth_dependency(request: Request, user_status: UserStatus):
         ).hexdigest()
         if hashed_token != hashed_env_token:
             raise HTTPException(status_code=403, detail="Invalid bearer token")
-        return  # If the token is valid, we just return
+        return ROBOTOFF_USER_ID  # If the token is valid, we just return
 
     # If no bearer token is provided, we check for session cookie
     # Check for session cookie
@@ -105,18 +109,90 @@ async def auth_dependency(request: Request, user_status: UserStatus):
         if user_data.get("moderator") is None:
             raise HTTPException(status_code=403, detail="User is not logged in")
 
+    # The user data is the user record of Product Opener
+    user_id = user_data.get("userid")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid session token")
+    return user_id
+
+
+# Auth server lookups in progress, by cache key
+_pending_lookups: dict[str, asyncio.Task] = {}
+
 
-@cache(key_builder=generate_cache_key, namespace="user-data", expire=60 * 60)
 async def _get_user_data_cached(session_cookie: str, auth_base_url: str) -> dict:
-    return await _fetch_user_data(session_cookie, auth_base_url)
+    key = generate_cache_key(session_cookie, auth_base_url)
+    entry = await session_cache.get(key)
+    if entry is not None:
+        if entry.user_data is None:
+            raise HTTPException(status_code=401, detail="Invalid session token")
+        if session_cache.is_stale(entry):
+            # Serve the stale data, and refresh it in the background
+            _lookup_user_data(key, session_cookie, auth_base_url)
+        return entry.user_data
+
+    # The lookup is shielded, so that it's not cancelled for the other
+    # requests waiting for it if this request is cancelled
+    return await asyncio.shield(_lookup_user_data(key, session_cookie, auth_base_url))
+
+
+def _lookup_user_data(
+    key: str, session_cookie: str, auth_base_url: str
+) -> asyncio.Task:
+    """Fetch the user data from the auth server and cache it.
+
+    Concurrent lookups of the same session share a single call to the auth
+    server: return the task of the lookup in progress if there is one.
+    """
+    task = _pending_lookups.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _fetch_and_cache_user_data(key, session_cookie, auth_base_url)
+        )
+        _pending_lookups[key] = task
+        task.add_done_callback(lambda task: _lookup_done(key, task))
+    return task
+
+
+def _lookup_done(key: str, task: asyncio.Task):
+    _pending_lookups.pop(key, None)
+    if not task.cancelled():
+        # Mark the exception as retrieved, background refreshes are not
+        # awaited
+        task.exception()
+
+
+async def _fetch_and_cache_user_data(
+    key: str, session_cookie: str, auth_base_url: str
+) -> dict:
+    try:
+        user_data = await _fetch_user_data(session_cookie, auth_base_url)
+    except HTTPException as e:
+        if e.status_code == 401:
+            # Cache invalid sessions too, for a shorter time
+            await session_cache.set(key, None, settings.session_cache_negative_ttl)
+        raise
+    await session_cache.set(key, user_data, settings.session_cache_ttl)
+    return user_data
 
 
 async def _fetch_user_data(session_cookie: str, auth_base_url: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            auth_base_url, cookies={"session": session_cookie}, params={"body": "1"}
+    try:
+        response = await auth_client.get(
+            auth_base_url,
+            headers={"Cookie": f"session={session_cookie}"},
+            params={"body": "1"},
+        )
+    except (httpx.HTTPError, CircuitOpenError):
+        raise HTTPException(
+            status_code=503, detail="Authentication server is unavailable"
         )
 
+    if response.status_code >= 500:
+        # Fail fast, the circuit breaker takes care of a failing auth server
+        raise HTTPException(
+            status_code=503, detail="Authentication server is unavailable"
+        )
     if response.status_code != 200:
         await asyncio.sleep(2)
         raise HTTPException(status_code=401, detail="Invalid session token")
@@ -0,0 +1,226 @@
+import asyncio
+import importlib.util
+import threading
+import time
+from enum import StrEnum, auto
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+from openfoodfacts.utils import get_logger
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.metrics import AUTH_SERVER_DURATION, AUTH_SERVER_REJECTIONS
+
+logger = get_logger(__name__)
+
+
+class CircuitState(StrEnum):
+    # Requests are sent
+    closed = auto()
+    # The server is failing, requests are rejected without being sent
+    open = auto()
+    # A trial request is sent, to check whether the server recovered
+    half_open = auto()
+
+
+class AuthClientStats(BaseModel):
+    """Statistics of the calls to the auth server."""
+
+    requests: int = Field(..., description="Number of requests sent")
+    errors: int = Field(
+        ...,
+        description="Number of requests that failed without a response "
+        "(connection error, timeout...)",
+    )
+    responses_by_status: dict[int, int] = Field(
+        ..., description="Number of responses by HTTP status code"
+    )
+    latency_seconds_sum: float = Field(
+        ..., description="Total duration of the requests, in seconds"
+    )
+    latency_seconds_max: float = Field(
+        ..., description="Duration of the slowest request, in seconds"
+    )
+    circuit_state: CircuitState = Field(
+        ..., description="State of the circuit breaker of the auth server"
+    )
+    circuit_rejections: int = Field(
+        ...,
+        description="Number of requests rejected without being sent, because "
+        "the auth server was failing",
+    )
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is rejected because the circuit is open."""
+
+
+class CircuitBreaker:
+    """Stop sending requests to a failing server for a while.
+
+    The circuit opens after `failure_threshold` consecutive failures. While
+    it is open, requests are rejected immediately. After `reset_timeout`
+    seconds, a single trial request is let through: the circuit closes if it
+    succeeds, and opens again otherwise.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.closed
+        self._failures = 0
+        self._opened_at = 0.0
+        self.rejections = 0
+
+    def allow(self) -> bool:
+        """Return whether a request can be sent."""
+        if self.state is CircuitState.open:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejections += 1
+                return False
+            self.state = CircuitState.half_open
+            return True
+        if self.state is CircuitState.half_open:
+            # A trial request is in progress
+            self.rejections += 1
+            return False
+        return True
+
+    def record_success(self):
+        self.state = CircuitState.closed
+        self._failures = 0
+
+    def record_cancellation(self):
+        if self.state is CircuitState.half_open:
+            # The trial request was cancelled, let the next request be the
+            # trial one
+            self.state = CircuitState.open
+            self._opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        self._failures += 1
+        if (
+            self.state is CircuitState.half_open
+            or self._failures >= self.failure_threshold
+        ):
+            if self.state is not CircuitState.open:
+                logger.warning("Auth server is failing, opening the circuit")
+            self.state = CircuitState.open
+            self._opened_at = time.monotonic()
+
+
+class AuthClient:
+    """Process-wide HTTP client for the auth server.
+
+    Connections are kept alive and reused across requests (with HTTP/2 if
+    the server supports it), instead of opening a new connection for each
+    call. The client is opened and closed with the app, see `open` and
+    `close`.
+
+    Requests go through a circuit breaker: if the auth server keeps failing
+    (connection errors, timeouts, 5xx responses), requests fail fast with
+    `CircuitOpenError` instead of piling up.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._responses_by_status: dict[int, int] = {}
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self.circuit_breaker = CircuitBreaker(
+            settings.auth_circuit_failure_threshold,
+            settings.auth_circuit_reset_timeout,
+        )
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = settings.auth_http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("h2 package is not installed, HTTP/2 is disabled")
+            http2 = False
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.auth_max_connections,
+                max_keepalive_connections=settings.auth_max_keepalive_connections,
+                keepalive_expiry=settings.auth_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                settings.auth_timeout, connect=settings.auth_connect_timeout
+            ),
+            # The client is shared by all users: never store cookies set by
+            # the auth server, the session cookie is sent with each request
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+
+    async def open(self):
+        if self._client is None:
+            self._client = self._create_client()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """Send a GET request, and record its latency and outcome.
+
+        Raise `CircuitOpenError` if the auth server is failing.
+        """
+        if self._client is None:
+            # The app was not started (e.g. in scripts), open the client
+            # lazily
+            await self.open()
+        if not self.circuit_breaker.allow():
+            AUTH_SERVER_REJECTIONS.inc()
+            raise CircuitOpenError("Auth server is failing")
+        start = time.perf_counter()
+        try:
+            response = await self._client.get(url, **kwargs)
+        except httpx.HTTPError:
+            self._record(time.perf_counter() - start, None)
+            self.circuit_breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.circuit_breaker.record_cancellation()
+            raise
+        self._record(time.perf_counter() - start, response.status_code)
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return response
+
+    def _record(self, latency: float, status_code: int | None):
+        AUTH_SERVER_DURATION.labels(
+            "error" if status_code is None else str(status_code)
+        ).observe(latency)
+        with self._stats_lock:
+            self._requests += 1
+            if status_code is None:
+                self._errors += 1
+            else:
+                self._responses_by_status[status_code] = (
+                    self._responses_by_status.get(status_code, 0) + 1
+                )
+            self._latency_sum += latency
+            self._latency_max = max(self._latency_max, latency)
+
+    def stats(self) -> AuthClientStats:
+        """Return the statistics of the calls to the auth server."""
+        with self._stats_lock:
+            return AuthClientStats(
+                requests=self._requests,
+                errors=self._errors,
+                responses_by_status=dict(self._responses_by_status),
+                latency_seconds_sum=self._latency_sum,
+                latency_seconds_max=self._latency_max,
+                circuit_state=self.circuit_breaker.state,
+                circuit_rejections=self.circuit_breaker.rejections,
+            )
+
+
+auth_client = AuthClient()
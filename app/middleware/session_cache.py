@@ -0,0 +1,255 @@
+"""Cache of the user data returned by the auth server, by session.
+
+The cache has two tiers:
+
+- a local tier, in the memory of the process, bounded in size (least
+  recently used entries are evicted first)
+- an optional shared tier (a Redis-compatible store), consulted on local
+  misses, so that all uvicorn workers benefit from each other's lookups
+
+Invalid sessions are cached too (with a shorter TTL), so that repeated
+requests with an invalid cookie do not all reach the auth server.
+
+Valid sessions are kept `stale_ttl` seconds longer than their TTL: during
+this time, they are still returned but flagged as stale, so that they can be
+served while being refreshed in the background.
+"""
+
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import NamedTuple
+
+from openfoodfacts.utils import get_logger
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.metrics import SESSION_CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    # User data, or None if the session is invalid
+    user_data: dict | None
+    # Remaining time to live, in seconds
+    ttl: float
+
+
+class SessionCacheStats(BaseModel):
+    """Statistics of the session cache."""
+
+    hits: int = Field(..., description="Number of lookups found in the cache")
+    negative_hits: int = Field(
+        ..., description="Number of hits on a session cached as invalid"
+    )
+    stale_hits: int = Field(
+        ..., description="Number of hits on a stale entry, refreshed in the background"
+    )
+    misses: int = Field(..., description="Number of lookups not found in the cache")
+    local_hits: int = Field(..., description="Number of hits in the local tier")
+    shared_hits: int = Field(..., description="Number of hits in the shared tier")
+    shared_errors: int = Field(
+        ...,
+        description="Number of failed calls to the shared tier, they are "
+        "handled as misses",
+    )
+    evictions: int = Field(
+        ...,
+        description="Number of entries evicted from the local tier because it "
+        "was full",
+    )
+    expirations: int = Field(
+        ..., description="Number of expired entries removed from the local tier"
+    )
+    size: int = Field(..., description="Number of entries in the local tier")
+    max_size: int = Field(
+        ..., description="Maximum number of entries in the local tier"
+    )
+
+
+class SessionCacheBackend(ABC):
+    """A tier of the session cache."""
+
+    @abstractmethod
+    async def get(self, key: str) -> CacheEntry | None:
+        """Return the cache entry of the key, or None if it is not cached (or
+        expired)."""
+
+    @abstractmethod
+    async def set(self, key: str, user_data: dict | None, ttl: float):
+        """Cache the user data of a session (None for an invalid session)
+        for `ttl` seconds."""
+
+    async def close(self):
+        pass
+
+
+class LocalSessionCache(SessionCacheBackend):
+    """In-process LRU cache with a TTL per entry."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # key -> (expiration time, user data), least recently used first
+        self._entries: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> CacheEntry | None:
+        if (entry := self._entries.get(key)) is None:
+            return None
+        expires_at, user_data = entry
+        ttl = expires_at - time.monotonic()
+        if ttl <= 0:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return CacheEntry(user_data, ttl)
+
+    async def set(self, key: str, user_data: dict | None, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, user_data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class RedisSessionCache(SessionCacheBackend):
+    """Cache stored in a Redis-compatible store, shared by all workers."""
+
+    def __init__(self, url: str, timeout: float):
+        # Only required if a shared cache is configured
+        import redis.asyncio as redis
+
+        self._client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+
+    async def get(self, key: str) -> CacheEntry | None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            value, ttl_ms = await pipeline.get(key).pttl(key).execute()
+        if value is None or ttl_ms <= 0:
+            return None
+        return CacheEntry(json.loads(value)["user"], ttl_ms / 1000)
+
+    async def set(self, key: str, user_data: dict | None, ttl: float):
+        await self._client.set(
+            key, json.dumps({"user": user_data}), px=max(int(ttl * 1000), 1)
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class SessionCache:
+    """Two-tier session cache, see the module docstring."""
+
+    def __init__(
+        self,
+        local: LocalSessionCache,
+        shared: SessionCacheBackend | None = None,
+        stale_ttl: float = 0,
+    ):
+        self.local = local
+        self.shared = shared
+        self.stale_ttl = stale_ttl
+        self._hits = 0
+        self._negative_hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._local_hits = 0
+        self._shared_hits = 0
+        self._shared_errors = 0
+
+    async def get(self, key: str) -> CacheEntry | None:
+        """Return the cache entry of the key, or None if it is not cached."""
+        entry = await self.local.get(key)
+        if entry is not None:
+            self._local_hits += 1
+        elif self.shared is not None:
+            try:
+                entry = await self.shared.get(key)
+            except Exception as e:
+                self._shared_errors += 1
+                logger.warning("Shared session cache lookup failed: %s", e)
+            if entry is not None:
+                self._shared_hits += 1
+                # Keep it locally until it expires in the shared tier
+                await self.local.set(key, entry.user_data, entry.ttl)
+
+        if entry is None:
+            self._misses += 1
+            result = "miss"
+        else:
+            self._hits += 1
+            result = "hit"
+            if entry.user_data is None:
+                self._negative_hits += 1
+                result = "negative_hit"
+            elif self.is_stale(entry):
+                self._stale_hits += 1
+                result = "stale_hit"
+        SESSION_CACHE_LOOKUPS.labels(result).inc()
+        return entry
+
+    def is_stale(self, entry: CacheEntry) -> bool:
+        """Return whether the entry expired and should be refreshed."""
+        return entry.user_data is not None and entry.ttl <= self.stale_ttl
+
+    async def set(self, key: str, user_data: dict | None, ttl: float):
+        """Cache the user data of a session (None for an invalid session)
+        for `ttl` seconds, in all tiers.
+
+        Valid sessions are then kept as stale entries for `stale_ttl`
+        seconds.
+        """
+        if user_data is not None:
+            ttl += self.stale_ttl
+        await self.local.set(key, user_data, ttl)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, user_data, ttl)
+            except Exception as e:
+                self._shared_errors += 1
+                logger.warning("Shared session cache update failed: %s", e)
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+    def stats(self) -> SessionCacheStats:
+        """Return the statistics of the cache."""
+        return SessionCacheStats(
+            hits=self._hits,
+            negative_hits=self._negative_hits,
+            stale_hits=self._stale_hits,
+            misses=self._misses,
+            local_hits=self._local_hits,
+            shared_hits=self._shared_hits,
+            shared_errors=self._shared_errors,
+            evictions=self.local.evictions,
+            expirations=self.local.expirations,
+            size=len(self.local),
+            max_size=self.local.max_size,
+        )
+
+
+def _create_session_cache() -> SessionCache:
+    shared = None
+    if settings.session_cache_redis_url:
+        shared = RedisSessionCache(
+            settings.session_cache_redis_url, settings.session_cache_redis_timeout
+        )
+    return SessionCache(
+        LocalSessionCache(settings.session_cache_max_size),
+        shared,
+        stale_ttl=settings.session_cache_stale_ttl,
+    )
+
+
+session_cache = _create_session_cache()
@@ -1,38 +1,137 @@
+import hashlib
+import uuid
+
 from peewee import (
     CharField,
+    CompositeKey,
+    DateField,
     DateTimeField,
     FloatField,
     ForeignKeyField,
+    IntegerField,
     Model,
     PostgresqlDatabase,
     TextField,
+    UUIDField,
 )
 from peewee_migrate import Router
+from playhouse.postgres_ext import ArrayField
+from psycopg.conninfo import make_conninfo
 
+from .async_db import AsyncDatabase
 from .config import settings
+from .database import (
+    InstrumentedPostgresqlDatabase,
+    ManagedPooledPostgresqlDatabase,
+    PoolStats,
+)
+
+
+def _create_database() -> PostgresqlDatabase:
+    """Create the database, using a connection pool if it's enabled in the
+    settings."""
+    connect_kwargs = dict(
+        user=settings.postgres_user,
+        password=settings.postgres_password,
+        host=settings.postgres_host,
+        port=settings.postgres_port,
+    )
+    if not settings.postgres_pool_enabled:
+        return InstrumentedPostgresqlDatabase(settings.postgres_db, **connect_kwargs)
+
+    return ManagedPooledPostgresqlDatabase(
+        settings.postgres_db,
+        min_connections=settings.postgres_pool_min_size,
+        max_connections=settings.postgres_pool_max_size,
+        timeout=settings.postgres_pool_timeout,
+        idle_timeout=settings.postgres_pool_idle_timeout,
+        stale_timeout=settings.postgres_pool_recycle,
+        **connect_kwargs,
+    )
+
 
-db = PostgresqlDatabase(
-    settings.postgres_db,
-    user=settings.postgres_user,
-    password=settings.postgres_password,
-    host=settings.postgres_host,
-    port=settings.postgres_port,
+db = _create_database()
+
+# Async database, used by the request hot paths. It has its own connection
+# pool, configured with the same settings as the sync one.
+async_db = AsyncDatabase(
+    make_conninfo(
+        dbname=settings.postgres_db,
+        user=settings.postgres_user,
+        password=settings.postgres_password,
+        host=settings.postgres_host,
+        port=settings.postgres_port,
+    ),
+    min_size=settings.postgres_pool_min_size,
+    max_size=settings.postgres_pool_max_size,
+    timeout=settings.postgres_pool_timeout,
+    max_idle=settings.postgres_pool_idle_timeout,
+    max_lifetime=settings.postgres_pool_recycle,
 )
 
 
+def get_pool_stats() -> PoolStats | None:
+    """Return the statistics of the connection pool, or None if connection
+    pooling is disabled."""
+    if isinstance(db, ManagedPooledPostgresqlDatabase):
+        return db.pool_stats()
+    return None
+
+
+def url_hash(url: str) -> uuid.UUID:
+    """Return the hash of a URL, stored in the `url_hash` column of tickets
+    and flags.
+
+    It's the MD5 digest of the URL as a UUID (16 bytes), the same value as
+    `md5(url)::uuid` in PostgreSQL.
+    """
+    return uuid.UUID(hashlib.md5(url.encode()).hexdigest())
+
+
 class TicketModel(Model):
     # barcode of the product, if any
     barcode = TextField(null=True)
     type = CharField(max_length=50)
     url = TextField()
+    # Fixed-width key of the URL, used instead of the URL in the ticket
+    # identity (see `url_hash`)
+    url_hash = UUIDField()
     status = CharField(max_length=50)
     image_id = CharField(null=True)
     flavor = CharField(max_length=20)
     created_at = DateTimeField()
+    # Aggregates of the flags of the ticket, updated with each new flag (see
+    # `app.ticket_aggregates`)
+    flag_count = IntegerField(default=0)
+    # distinct reasons and sources of the flags
+    reasons = ArrayField(TextField, default=list, index=True)
+    sources = ArrayField(TextField, default=list, index=False)
+    # maximum confidence of the flags, only Robotoff flags have a confidence
+    max_confidence = FloatField(null=True)
+    last_flagged_at = DateTimeField(null=True)
+    # Moderator working on the ticket, until `claimed_until` (see
+    # `claim_tickets`)
+    claimed_by = TextField(null=True)
+    claimed_until = DateTimeField(null=True)
+    # Date of the last change of the ticket or of its flag aggregates, set by
+    # a trigger on each update (see `app.etags`)
+    updated_at = DateTimeField()
+    # Insertion date, set by the database (see `app.export`)
+    inserted_at = DateTimeField()
 
     class Meta:
         database = db
         table_name = "tickets"
+        indexes = (
+            # Used to list tickets by creation date or by number of flags
+            # (see `get_tickets`)
+            (("created_at", "id"), False),
+            (("status", "created_at", "id"), False),
+            (("flag_count", "id"), False),
+            (("status", "flag_count", "id"), False),
+            # Used to compute the ETags of ticket listings
+            (("status", "updated_at"), False),
+        )
 
 
 class ModeratorActionModel(Model):
@@ -40,6 +139,8 @@ class ModeratorActionModel(Model):
     user_id = TextField()
     ticket = ForeignKeyField(TicketModel, backref="moderator_actions")
     created_at = DateTimeField()
+    # Insertion date, set by the database (see `app.export`)
+    inserted_at = DateTimeField()
 
     class Meta:
         database = db
@@ -51,6 +152,7 @@ class FlagModel(Model):
     barcode = TextField(null=True)
     type = CharField(max_length=50)
     url = TextField()
+    url_hash = UUIDField()
     user_id = TextField()
     device_id = TextField()
     source = CharField()
@@ -59,13 +161,36 @@ class FlagModel(Model):
     flavor = CharField(max_length=20)
     reason = TextField(null=True)
     comment = TextField(null=True)
-    created_at = DateTimeField()
+    # Used to filter flags by creation date (see `get_flags`)
+    created_at = DateTimeField(index=True)
+    # Insertion date, set by the database (see `app.export`)
+    inserted_at = DateTimeField()
 
     class Meta:
         database = db
         table_name = "flags"
 
 
+class TicketDailyStatsModel(Model):
+    """Number of tickets created each day, by status, flavor and type.
+
+    This is a rollup of the `tickets` table, kept up to date in the same
+    transaction as ticket changes (see `app.stats`).
+    """
+
+    # creation day of the tickets (UTC)
+    day = DateField()
+    status = CharField(max_length=50)
+    flavor = CharField(max_length=20)
+    type = CharField(max_length=50)
+    n_tickets = IntegerField()
+
+    class Meta:
+        database = db
+        table_name = "ticket_daily_stats"
+        primary_key = CompositeKey("day", "status", "flavor", "type")
+
+
 def run_migration():
     """Run all unapplied migrations."""
     # embedding schema does not exist at DB initialization
@@ -0,0 +1,195 @@
+"""Opt-in profiling of the database queries of each request.
+
+When `query_profiling_enabled` is set, the statements executed during a
+request, on the sync (`app.models.db`) and async (`app.models.async_db`)
+databases, are recorded with the shape of their parameters (their types, not
+their values) and their duration. Requests whose query count or total
+database time cross the configured thresholds are logged as warnings (and
+reported to Sentry, if enabled), with their statements.
+
+A sampled fraction of the slow SELECT statements of these requests are run
+again with EXPLAIN (ANALYZE, BUFFERS) once the response is sent, and their
+plan is logged. EXPLAIN ANALYZE executes the statements: other statements,
+and SELECT statements with side effects (sequence increments, notifications
+and row locks), are never explained, and the transaction of the EXPLAIN is
+always rolled back.
+
+Statements are also recorded as Sentry spans, so that they appear in the
+Sentry traces of the requests (see `sentry_traces_sample_rate`).
+"""
+
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, NamedTuple
+
+import sentry_sdk
+from openfoodfacts.utils import get_logger
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+from .metrics import observe_query
+
+logger = get_logger(__name__)
+
+# Maximum number of statements explained for a request
+MAX_EXPLAINS_PER_REQUEST = 3
+# Statement timeout of the EXPLAIN ANALYZE queries
+EXPLAIN_TIMEOUT = "10s"
+# SELECT statements with side effects, that must not be run again: sequence
+# increments are not rolled back
+_SIDE_EFFECTS = re.compile(
+    r"\b(nextval|setval|pg_notify)\s*\(|\bFOR\s+(NO\s+KEY\s+)?UPDATE\b"
+    r"|\bFOR\s+(KEY\s+)?SHARE\b",
+    re.IGNORECASE,
+)
+
+
+class QueryRecord(NamedTuple):
+    # `sync` or `async`
+    database: str
+    sql: str
+    # Type of each parameter, e.g. ("str", "list[3]", "NoneType")
+    params_shape: tuple[str, ...]
+    duration: float
+    params: tuple
+
+
+# Statements of the current request, None if it is not profiled
+_request_queries: ContextVar[list[QueryRecord] | None] = ContextVar(
+    "request_queries", default=None
+)
+
+
+def _params_shape(params) -> tuple[str, ...]:
+    return tuple(
+        f"list[{len(param)}]" if isinstance(param, list) else type(param).__name__
+        for param in params or ()
+    )
+
+
+def _is_explainable(sql: str) -> bool:
+    return sql.lstrip()[:6].upper() == "SELECT" and not _SIDE_EFFECTS.search(sql)
+
+
+@contextmanager
+def profile_query(database: str, sql: str, params=None) -> Iterator[None]:
+    """Time the execution of a statement on the `sync` or `async` database,
+    for the metrics and, if the request is profiled, its profile."""
+    queries = _request_queries.get()
+    if queries is None:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe_query(database, time.perf_counter() - start)
+        return
+
+    params_shape = _params_shape(params)
+    with sentry_sdk.start_span(op="db", description=sql) as span:
+        span.set_data("db.system", "postgresql")
+        span.set_data("db.database", database)
+        span.set_data("db.params_shape", params_shape)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            observe_query(database, duration)
+            queries.append(
+                QueryRecord(database, sql, params_shape, duration, tuple(params or ()))
+            )
+
+
+@contextmanager
+def record_queries() -> Iterator[list[QueryRecord]]:
+    """Record the statements executed in the block, and in the threads
+    started with a copy of its context (e.g. sync endpoints), in the yielded
+    list."""
+    queries: list[QueryRecord] = []
+    token = _request_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _request_queries.reset(token)
+
+
+async def _explain(query: QueryRecord) -> str:
+    # Imported here, as the databases import this module
+    from .models import async_db
+
+    with sentry_sdk.start_span(op="db.explain", description=query.sql) as span:
+        # Nothing the statement did is kept
+        async with async_db.atomic(rollback=True) as session:
+            await session.execute(f"SET LOCAL statement_timeout = '{EXPLAIN_TIMEOUT}'")
+            rows = await session.fetchall(
+                f"EXPLAIN (ANALYZE, BUFFERS) {query.sql}", query.params
+            )
+        plan = "\n".join(row[0] for row in rows)
+        span.set_data("db.plan", plan)
+    return plan
+
+
+def _format_query(query: QueryRecord) -> str:
+    return (
+        f"{query.duration * 1000:.1f} ms ({query.database}) {query.sql} "
+        f"{list(query.params_shape)}"
+    )
+
+
+async def report_slow_request(method: str, path: str, queries: list[QueryRecord]):
+    """Log the statements of a request if it crossed the thresholds, and the
+    plans of a sample of its slow statements."""
+    db_time = sum(query.duration for query in queries)
+    if (
+        len(queries) < settings.query_profiling_request_max_queries
+        and db_time < settings.query_profiling_request_max_db_time
+    ):
+        return
+
+    lines = [_format_query(query) for query in queries]
+    explained = 0
+    for query in sorted(queries, key=lambda query: query.duration, reverse=True):
+        if explained >= MAX_EXPLAINS_PER_REQUEST:
+            break
+        if (
+            query.duration < settings.query_profiling_slow_query_time
+            or not _is_explainable(query.sql)
+            or random.random() >= settings.query_profiling_explain_rate
+        ):
+            continue
+        explained += 1
+        try:
+            plan = await _explain(query)
+        except Exception as e:
+            logger.warning("EXPLAIN of a slow statement failed: %s", e)
+            continue
+        lines.append(f"Plan of: {_format_query(query)}\n{plan}")
+    logger.warning(
+        "Slow request %s %s: %d queries, %.1f ms of database time\n%s",
+        method,
+        path,
+        len(queries),
+        db_time * 1000,
+        "\n".join(lines),
+    )
+
+
+class QueryProfilingMiddleware:
+    """Profile the database queries of each HTTP request, see the module
+    docstring."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with record_queries() as queries:
+            await self.app(scope, receive, send)
+        # The response is sent, the client does not wait for the report
+        await report_slow_request(scope["method"], scope["path"], queries)
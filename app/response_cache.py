@@ -0,0 +1,120 @@
+"""Cache of the responses of the moderator read endpoints.
+
+Responses are cached serialized, in the memory of the process (a bounded LRU
+cache per uvicorn worker), by route and normalized query parameters, for at
+most the TTL of the route (`response_cache_ttl`).
+
+Entries are invalidated by a version counter shared by all processes: the
+`response_cache_version` Postgres sequence. Each cached response is stored
+with the version read before its data, and is only served while the version
+did not change. Writes increment the version after their transaction is
+committed, and before responding (see `invalidate`): once a write is done,
+responses cached before it are never served.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from .async_db import AsyncSession
+from .config import settings
+from .metrics import RESPONSE_CACHE_LOOKUPS
+from .models import async_db, db
+
+VERSION_SEQUENCE = "response_cache_version"
+
+
+def get_version() -> int:
+    """Return the current version of the cached data."""
+    return db.execute_sql(f"SELECT last_value FROM {VERSION_SEQUENCE}").fetchone()[0]
+
+
+async def get_version_async(session: AsyncSession) -> int:
+    return await session.scalar(f"SELECT last_value FROM {VERSION_SEQUENCE}")
+
+
+def invalidate():
+    """Invalidate all cached responses, after a write was committed."""
+    db.execute_sql(f"SELECT nextval('{VERSION_SEQUENCE}')")
+
+
+async def invalidate_async():
+    async with async_db.atomic() as session:
+        await session.execute(f"SELECT nextval('{VERSION_SEQUENCE}')")
+
+
+class ResponseCache:
+    """In-process LRU cache of serialized JSON responses, see the module
+    docstring."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # key -> (expiration time, version, body, headers), least recently
+        # used first
+        self._entries: OrderedDict[
+            str, tuple[float, int, bytes, dict[str, str] | None]
+        ] = OrderedDict()
+        # Sync endpoints use the cache from the threads of the threadpool
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(route: str, **params) -> str:
+        """Return the cache key of a request to the route, with the given
+        parameters (None parameters are ignored, lists are sorted)."""
+        normalized = {
+            name: sorted(value) if isinstance(value, list) else value
+            for name, value in params.items()
+            if value is not None
+        }
+        return f"{route}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+    def get(self, route: str, key: str, version: int) -> Response | None:
+        """Return the cached response of the key, or None if it is not
+        cached for this version."""
+        body = headers = None
+        if settings.response_cache_enabled:
+            with self._lock:
+                if (entry := self._entries.get(key)) is not None:
+                    expires_at, entry_version, entry_body, entry_headers = entry
+                    if entry_version == version and expires_at > time.monotonic():
+                        self._entries.move_to_end(key)
+                        body, headers = entry_body, entry_headers
+                    else:
+                        del self._entries[key]
+        RESPONSE_CACHE_LOOKUPS.labels(route, "miss" if body is None else "hit").inc()
+        if body is None:
+            return None
+        return Response(body, media_type="application/json", headers=headers)
+
+    def set(
+        self,
+        route: str,
+        key: str,
+        version: int,
+        content: Any,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        """Cache the response of the key, with the data of `version` and the
+        given headers (e.g. its ETag), and return it."""
+        response = JSONResponse(jsonable_encoder(content), headers=headers)
+        ttl = settings.response_cache_ttl.get(route, 0)
+        if settings.response_cache_enabled and ttl > 0:
+            with self._lock:
+                self._entries[key] = (
+                    time.monotonic() + ttl,
+                    version,
+                    response.body,
+                    headers,
+                )
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return response
+
+
+response_cache = ResponseCache(settings.response_cache_max_size)
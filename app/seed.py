@@ -0,0 +1,309 @@
+"""Generation of a synthetic dataset of tickets and flags, shaped like the
+production data, to tune indexes and queries.
+
+- the number of flags per ticket, and the products of image tickets, follow
+  a Zipf distribution: a few products get most of the flags
+- tickets are of all types (product, image, search) and flavors, with a
+  configurable ratio of closed tickets
+- some tickets are flagged by Robotoff, with a confidence
+
+The dataset only depends on the parameters and the seed (and on the IDs of
+the tickets, which are the same on an empty database). Rows are loaded with
+COPY, by batches of tickets, each batch being a transaction that also
+updates the daily ticket statistics. Ticket aggregates are computed while
+generating the flags.
+"""
+
+import bisect
+import csv
+import hashlib
+import io
+import itertools
+import random
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from openfoodfacts import Flavor
+from openfoodfacts.images import generate_image_url
+from openfoodfacts.utils import URLBuilder
+
+from .config import settings
+from .models import FlagModel, TicketModel, db, url_hash
+from .stats import TicketStatsDelta
+
+# Relative frequency of each ticket type
+TYPE_WEIGHTS = {"image": 5, "product": 4, "search": 1}
+# Relative frequency of each flavor, Open Food Facts being the most common
+FLAVOR_WEIGHTS = {Flavor.off: 16, Flavor.obf: 1, Flavor.opff: 1, Flavor.opf: 1}
+FLAVOR_WEIGHTS.update({flavor: 1 for flavor in Flavor if flavor not in FLAVOR_WEIGHTS})
+REASONS = ["inappropriate", "human", "beauty", "other", None]
+# Sources of the flags of users
+USER_SOURCE_WEIGHTS = {"mobile": 3, "web": 2}
+# Flags of a ticket are spread over this time after its creation
+FLAGGING_PERIOD = timedelta(days=30)
+
+_TICKET_COLUMNS = [
+    "id",
+    "barcode",
+    "type",
+    "url",
+    "url_hash",
+    "status",
+    "image_id",
+    "flavor",
+    "created_at",
+    "flag_count",
+    "reasons",
+    "sources",
+    "max_confidence",
+    "last_flagged_at",
+    "updated_at",
+]
+_FLAG_COLUMNS = [
+    "ticket_id",
+    "barcode",
+    "type",
+    "url",
+    "url_hash",
+    "user_id",
+    "device_id",
+    "source",
+    "confidence",
+    "image_id",
+    "flavor",
+    "reason",
+    "comment",
+    "created_at",
+]
+
+
+class SeedParameters(NamedTuple):
+    n_tickets: int
+    n_flags: int
+    seed: int = 0
+    # Creation dates are spread over the `days` days before `end` (a naive UTC
+    # datetime, the beginning of the current day by default)
+    end: datetime | None = None
+    days: int = 365
+    closed_ratio: float = 0.8
+    # Ratio of tickets with a flag from Robotoff
+    robotoff_ratio: float = 0.2
+    # Exponent of the Zipf distributions
+    zipf_exponent: float = 1.0
+    n_users: int = 100000
+    max_flags_per_ticket: int = 1000
+    batch_size: int = 10000
+
+
+class _Ticket(NamedTuple):
+    # The fields used by `TicketStatsDelta`
+    created_at: datetime
+    status: str
+    flavor: str
+    type: str
+
+
+class _Zipf:
+    """Zipf distribution over the ranks 0 to n - 1."""
+
+    def __init__(self, n: int, exponent: float):
+        self._cum_weights = array("d")
+        total = 0.0
+        for rank in range(1, n + 1):
+            total += rank**-exponent
+            self._cum_weights.append(total)
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect(self._cum_weights, rng.random() * self._cum_weights[-1])
+
+
+def _flag_counts(params: SeedParameters, rng: random.Random) -> array:
+    """Return the number of flags of each ticket, by position: each ticket has
+    at least one flag, the other flags are spread with a Zipf distribution
+    over the tickets, in a random order of popularity."""
+    counts = array("I", [1]) * params.n_tickets
+    # Flags of a ticket are from distinct users
+    max_count = min(params.max_flags_per_ticket, params.n_users)
+    if params.n_flags > max_count * params.n_tickets:
+        raise ValueError("too many flags for the number of tickets and users")
+    zipf = _Zipf(params.n_tickets, params.zipf_exponent)
+    # Random bijection from the popularity ranks to the ticket positions
+    step = _coprime_step(params.n_tickets, rng)
+    n_extra = params.n_flags - params.n_tickets
+    while n_extra > 0:
+        position = zipf.sample(rng) * step % params.n_tickets
+        if counts[position] < max_count:
+            counts[position] += 1
+            n_extra -= 1
+    return counts
+
+
+def _coprime_step(n: int, rng: random.Random) -> int:
+    while True:
+        step = rng.randrange(1, max(n, 2))
+        a, b = step, n
+        while b:
+            a, b = b, a % b
+        if a == 1:
+            return step
+
+
+class _Choice:
+    """Weighted choice among the keys of `weights`."""
+
+    def __init__(self, weights: dict):
+        self._population = list(weights)
+        self._cum_weights = list(itertools.accumulate(weights.values()))
+
+    def sample(self, rng: random.Random):
+        return rng.choices(self._population, cum_weights=self._cum_weights)[0]
+
+
+def _copy(rows: list[list], model, columns: list[str]):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    db.cursor().copy_expert(
+        f"COPY {model._meta.table_name} ({', '.join(columns)}) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def _array(values: list[str]) -> str:
+    return "{" + ",".join(values) + "}"
+
+
+def seed(params: SeedParameters) -> tuple[int, int]:
+    """Generate tickets and flags, and return the number of tickets and flags
+    created."""
+    if params.n_flags < params.n_tickets:
+        raise ValueError("each ticket has at least one flag")
+    rng = random.Random(params.seed)
+    flag_counts = _flag_counts(params, rng)
+    # Products flagged on their images, by popularity
+    product_zipf = _Zipf(params.n_tickets, params.zipf_exponent)
+    types = _Choice(TYPE_WEIGHTS)
+    flavors = _Choice(FLAVOR_WEIGHTS)
+    user_sources = _Choice(USER_SOURCE_WEIGHTS)
+    environment = settings.off_tld
+    end = params.end or datetime.now(timezone.utc).replace(
+        tzinfo=None, hour=0, minute=0, second=0, microsecond=0
+    )
+    start = end - timedelta(days=params.days)
+    period = (end - start).total_seconds()
+    n_flags = 0
+
+    for batch_start in range(0, params.n_tickets, params.batch_size):
+        batch_end = min(batch_start + params.batch_size, params.n_tickets)
+        with db.atomic():
+            ticket_ids = [
+                row[0]
+                for row in db.execute_sql(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                    "FROM generate_series(1, %s)",
+                    (TicketModel._meta.table_name, batch_end - batch_start),
+                )
+            ]
+            tickets = []
+            flags = []
+            stats = TicketStatsDelta()
+            for position, ticket_id in zip(range(batch_start, batch_end), ticket_ids):
+                # Creation dates grow with IDs, as in production
+                created_at = start + timedelta(
+                    seconds=period * (position + rng.random()) / params.n_tickets
+                )
+                type_ = types.sample(rng)
+                flavor = flavors.sample(rng)
+                image_id = None
+                # Ticket IDs make the identity of generated tickets unique
+                if type_ == "product":
+                    barcode = str(2000000000000 + ticket_id)
+                    url = f"{URLBuilder.world(flavor, environment)}/product/{barcode}"
+                elif type_ == "image":
+                    barcode = str(3000000000000 + product_zipf.sample(rng))
+                    image_id = str(ticket_id)
+                    url = generate_image_url(barcode, image_id, flavor, environment)
+                else:
+                    barcode = None
+                    url = (
+                        f"{URLBuilder.world(flavor, environment)}"
+                        f"/cgi/search.pl?search_terms=seed-{ticket_id}"
+                    )
+                status = "closed" if rng.random() < params.closed_ratio else "open"
+                hash_ = url_hash(url)
+
+                n_ticket_flags = flag_counts[position]
+                users = rng.sample(range(params.n_users), n_ticket_flags)
+                reasons = set()
+                sources = set()
+                max_confidence = None
+                # Flags are never created after `end`
+                flagging_period = min(FLAGGING_PERIOD, end - created_at)
+                flagged_at = sorted(
+                    created_at
+                    + timedelta(seconds=rng.random() * flagging_period.total_seconds())
+                    for _ in range(n_ticket_flags)
+                )
+                # The first flag is created with the ticket
+                flagged_at[0] = created_at
+                for i in range(n_ticket_flags):
+                    if i == 0 and rng.random() < params.robotoff_ratio:
+                        user_id = "robotoff"
+                        source = "robotoff"
+                        confidence = round(rng.uniform(0.5, 1), 3)
+                        max_confidence = confidence
+                    else:
+                        user_id = f"user-{users[i]}"
+                        source = user_sources.sample(rng)
+                        confidence = None
+                    reason = rng.choice(REASONS)
+                    if reason is not None:
+                        reasons.add(reason)
+                    sources.add(source)
+                    flags.append(
+                        [
+                            ticket_id,
+                            barcode,
+                            type_,
+                            url,
+                            hash_,
+                            user_id,
+                            hashlib.sha1(user_id.encode()).hexdigest(),
+                            source,
+                            confidence,
+                            image_id,
+                            flavor.value,
+                            reason,
+                            None,
+                            flagged_at[i],
+                        ]
+                    )
+                tickets.append(
+                    [
+                        ticket_id,
+                        barcode,
+                        type_,
+                        url,
+                        hash_,
+                        status,
+                        image_id,
+                        flavor.value,
+                        created_at,
+                        n_ticket_flags,
+                        _array(sorted(reasons)),
+                        _array(sorted(sources)),
+                        max_confidence,
+                        flagged_at[-1],
+                        # Updated with the last flag
+                        flagged_at[-1],
+                    ]
+                )
+                stats.add(_Ticket(created_at, status, flavor.value, type_))
+
+            _copy(tickets, TicketModel, _TICKET_COLUMNS)
+            _copy(flags, FlagModel, _FLAG_COLUMNS)
+            stats.apply()
+            n_flags += len(flags)
+    return params.n_tickets, n_flags
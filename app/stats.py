@@ -0,0 +1,106 @@
+"""Daily ticket statistics.
+
+The number of tickets created each day, by status, flavor and type, is stored
+in the `ticket_daily_stats` rollup table, so that statistics over any period
+are computed from a few rows per day instead of scanning the tickets. Every
+change to the tickets (creation, status change) must be applied to the
+rollup in the same transaction, with `TicketStatsDelta`.
+"""
+
+from collections import Counter
+from datetime import date, datetime
+
+from peewee import EXCLUDED, Insert, fn
+
+from .models import TicketDailyStatsModel, TicketModel, db
+
+
+class TicketStatsDelta:
+    """Changes to apply to the daily ticket statistics."""
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+
+    def add(self, ticket: TicketModel, status: str | None = None, count: int = 1):
+        """Count `count` more tickets like `ticket`, with the given status (by
+        default the status of the ticket)."""
+        key = (
+            _day(ticket.created_at),
+            str(status or ticket.status),
+            str(ticket.flavor),
+            str(ticket.type),
+        )
+        self._counts[key] += count
+
+    def move(self, ticket: TicketModel, old_status: str, new_status: str):
+        """Move a ticket from a status to another."""
+        if old_status != new_status:
+            self.add(ticket, old_status, -1)
+            self.add(ticket, new_status)
+
+    def query(self) -> Insert | None:
+        """Return the query applying the changes, or None if there is nothing
+        to change."""
+        # Rows are always updated in the same order, so that concurrent
+        # transactions cannot deadlock
+        rows = [
+            dict(day=day, status=status, flavor=flavor, type=type_, n_tickets=count)
+            for (day, status, flavor, type_), count in sorted(self._counts.items())
+            if count
+        ]
+        if not rows:
+            return None
+        return TicketDailyStatsModel.insert_many(rows).on_conflict(
+            conflict_target=[
+                TicketDailyStatsModel.day,
+                TicketDailyStatsModel.status,
+                TicketDailyStatsModel.flavor,
+                TicketDailyStatsModel.type,
+            ],
+            update={
+                TicketDailyStatsModel.n_tickets: TicketDailyStatsModel.n_tickets
+                + EXCLUDED.n_tickets
+            },
+        )
+
+    def apply(self):
+        """Apply the changes with the sync database."""
+        query = self.query()
+        if query is not None:
+            query.execute()
+
+
+def _day(created_at: datetime) -> date:
+    # Creation datetimes are naive UTC datetimes
+    return created_at.date()
+
+
+def rebuild_ticket_stats() -> int:
+    """Rebuild the daily ticket statistics from the tickets.
+
+    Tickets are locked against writes during the rebuild, so that no change
+    is lost. As when they are archived, archived tickets (see `app.archive`)
+    are not counted.
+    Return the number of rows of the rollup table.
+    """
+    with db.atomic():
+        db.execute_sql(f"LOCK TABLE {TicketModel._meta.table_name} IN SHARE MODE")
+        TicketDailyStatsModel.delete().execute()
+        day = TicketModel.created_at.cast("date")
+        TicketDailyStatsModel.insert_from(
+            TicketModel.select(
+                day,
+                TicketModel.status,
+                TicketModel.flavor,
+                TicketModel.type,
+                fn.COUNT(TicketModel.id),
+            ).group_by(day, TicketModel.status, TicketModel.flavor, TicketModel.type),
+            [
+                TicketDailyStatsModel.day,
+                TicketDailyStatsModel.status,
+                TicketDailyStatsModel.flavor,
+                TicketDailyStatsModel.type,
+                TicketDailyStatsModel.n_tickets,
+            ],
+        ).execute()
+        return TicketDailyStatsModel.select().count()
@@ -0,0 +1,99 @@
+"""Aggregates of the flags of each ticket.
+
+Tickets carry aggregates of their flags (number of flags, distinct reasons
+and sources, maximum confidence and date of the last flag), so that tickets
+can be filtered and sorted on them without reading the flags. New flags must
+be added to the aggregates in the same transaction as their insertion, with
+`add_flags`.
+"""
+
+from .async_db import AsyncSession
+from .models import FlagModel, TicketModel, db
+
+# Aggregates of the flags selected by the WHERE clause, by ticket
+_FLAGS_AGGREGATES_SQL = """
+    SELECT
+        ticket_id,
+        count(*) AS flag_count,
+        coalesce(
+            array_agg(DISTINCT reason ORDER BY reason)
+            FILTER (WHERE reason IS NOT NULL),
+            '{{}}'
+        ) AS reasons,
+        array_agg(DISTINCT source::text ORDER BY source::text) AS sources,
+        max(confidence) AS max_confidence,
+        max(created_at) AS last_flagged_at
+    FROM flags
+    WHERE {where}
+    GROUP BY ticket_id
+"""
+
+_ADD_FLAGS_SQL = f"""
+UPDATE tickets SET
+    flag_count = tickets.flag_count + agg.flag_count,
+    reasons = ARRAY(
+        SELECT DISTINCT unnest(tickets.reasons || agg.reasons) ORDER BY 1
+    ),
+    sources = ARRAY(
+        SELECT DISTINCT unnest(tickets.sources || agg.sources) ORDER BY 1
+    ),
+    max_confidence = greatest(tickets.max_confidence, agg.max_confidence),
+    last_flagged_at = greatest(tickets.last_flagged_at, agg.last_flagged_at)
+FROM ({_FLAGS_AGGREGATES_SQL.format(where="id = ANY(%s)")}) AS agg
+WHERE tickets.id = agg.ticket_id
+"""
+
+_RECOMPUTE_SQL = f"""
+UPDATE tickets SET
+    flag_count = coalesce(agg.flag_count, 0),
+    reasons = coalesce(agg.reasons, '{{}}'),
+    sources = coalesce(agg.sources, '{{}}'),
+    max_confidence = agg.max_confidence,
+    last_flagged_at = agg.last_flagged_at
+FROM tickets AS t
+LEFT JOIN (
+    {_FLAGS_AGGREGATES_SQL.format(where="ticket_id = ANY(%s)")}
+) AS agg ON agg.ticket_id = t.id
+WHERE tickets.id = t.id AND t.id = ANY(%s)
+"""
+
+
+async def add_flags(session: AsyncSession, flag_ids: list[int]):
+    """Add new flags to the aggregates of their tickets."""
+    if flag_ids:
+        await session.execute(_ADD_FLAGS_SQL, (flag_ids,))
+
+
+def recompute(ticket_ids: list[int]) -> int:
+    """Recompute the aggregates of the tickets from their flags.
+
+    Return the number of updated tickets.
+    """
+    cursor = db.execute_sql(_RECOMPUTE_SQL, (ticket_ids, ticket_ids))
+    return cursor.rowcount
+
+
+def backfill(batch_size: int = 1000) -> int:
+    """Recompute the aggregates of all tickets, by batches of `batch_size`
+    tickets.
+
+    Each batch is a transaction, during which flags are locked against
+    writes, so that no new flag is missed. Return the number of updated
+    tickets.
+    """
+    n_updated = 0
+    last_id = 0
+    while True:
+        with db.atomic():
+            db.execute_sql(f"LOCK TABLE {FlagModel._meta.table_name} IN SHARE MODE")
+            ticket_ids = [
+                ticket.id
+                for ticket in TicketModel.select(TicketModel.id)
+                .where(TicketModel.id > last_id)
+                .order_by(TicketModel.id)
+                .limit(batch_size)
+            ]
+            if not ticket_ids:
+                return n_updated
+            n_updated += recompute(ticket_ids)
+        last_id = ticket_ids[-1]
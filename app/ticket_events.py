@@ -0,0 +1,249 @@
+"""Real-time events of ticket changes, streamed to moderators.
+
+Write paths send the events of their changes with NOTIFY on the
+`ticket_events` channel (see `notify` and `notify_async`), in their
+transaction: events are only delivered once the changes are committed, in
+commit order. Each event gets an ID from the `ticket_event_id` sequence.
+
+Each process has a single connection listening to the channel (see
+`TicketEventBroker`), whose events are fanned out to all the streams of the
+process, and kept in a buffer of the most recent events. A client reconnecting
+with the ID of the last event it got (Last-Event-ID) gets the events that
+followed it from the buffer. If the event is not in the buffer any more (or
+events were missed while listening was interrupted), the client gets a
+`reset` event instead, and must reload the tickets.
+
+Each stream has a bounded queue of events to send: when a client does not
+keep up and its queue is full, its stream is closed, without slowing down the
+other streams. The client reconnects and resumes from its last event.
+"""
+
+import asyncio
+from collections import deque
+from enum import StrEnum, auto
+from typing import AsyncIterator
+
+import psycopg
+from openfoodfacts.utils import get_logger
+from pydantic import BaseModel, ValidationError
+
+from .async_db import AsyncSession
+from .config import settings
+from .metrics import TICKET_EVENT_OVERFLOWS, TICKET_EVENT_SUBSCRIBERS
+from .models import db
+
+logger = get_logger(__name__)
+
+CHANNEL = "ticket_events"
+# Delay (in milliseconds) before clients reconnect after a stream is closed
+RECONNECT_DELAY = 1000
+# Maximum delay (in seconds) between attempts to listen again
+MAX_LISTEN_RETRY_DELAY = 30
+
+# The events are sent in a single statement, each with a new ID
+_NOTIFY_SQL = f"""
+SELECT pg_notify(
+    '{CHANNEL}',
+    (event::jsonb || jsonb_build_object('id', nextval('ticket_event_id')))::text
+)
+FROM unnest(%s::text[]) WITH ORDINALITY AS events(event, position)
+ORDER BY position
+"""
+
+
+class TicketEventType(StrEnum):
+    # A ticket was created, with its first flag
+    ticket_created = auto()
+    # A flag was added to a ticket
+    flag_added = auto()
+    # The status of a ticket changed
+    status_changed = auto()
+
+
+class TicketEvent(BaseModel):
+    # Assigned when the event is sent
+    id: int | None = None
+    type: TicketEventType
+    ticket_id: int
+    # Status of the ticket after the change
+    status: str
+    # Added flag, for `flag_added` events
+    flag_id: int | None = None
+
+
+def _notify_params(events: list[TicketEvent]) -> tuple:
+    return ([event.model_dump_json(exclude={"id"}) for event in events],)
+
+
+def notify(events: list[TicketEvent]):
+    """Send the events, in the current transaction of the sync database."""
+    if events:
+        db.execute_sql(_NOTIFY_SQL, _notify_params(events))
+
+
+async def notify_async(session: AsyncSession, events: list[TicketEvent]):
+    """Send the events, in the transaction of the session."""
+    if events:
+        await session.execute(_NOTIFY_SQL, _notify_params(events))
+
+
+def _format(event: TicketEvent) -> str:
+    """Format the event as a Server-Sent Events message."""
+    return (
+        f"id: {event.id}\n"
+        f"event: {event.type}\n"
+        f"data: {event.model_dump_json()}\n\n"
+    )
+
+
+_RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+# Queued for a stream when events were missed
+_RESET = object()
+# Queued to wake up a closed stream waiting for events
+_CLOSE = object()
+
+
+class _Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        # No event is queued any more, the stream ends once its queue is empty
+        self.closed = False
+
+
+class TicketEventBroker:
+    """Listen to the ticket events and fan them out to the streams of the
+    process, see the module docstring."""
+
+    def __init__(self, buffer_size: int, queue_size: int):
+        self.queue_size = queue_size
+        self._buffer: deque[TicketEvent] = deque(maxlen=buffer_size)
+        self._subscribers: set[_Subscriber] = set()
+        self._task: asyncio.Task | None = None
+
+    async def open(self, conninfo: str):
+        """Start listening to the events."""
+        self._task = asyncio.create_task(self._listen(conninfo))
+
+    async def close(self):
+        """Stop listening, and close the streams."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for subscriber in list(self._subscribers):
+            self._close(subscriber)
+
+    async def _listen(self, conninfo: str):
+        retry_delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    conninfo, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    logger.info("Listening to ticket events")
+                    retry_delay = 1
+                    async for notification in conn.notifies():
+                        try:
+                            event = TicketEvent.model_validate_json(
+                                notification.payload
+                            )
+                        except ValidationError:
+                            logger.warning(
+                                "Invalid ticket event: %s", notification.payload
+                            )
+                            continue
+                        self._publish(event)
+            except psycopg.Error as e:
+                logger.warning(
+                    "Listening to ticket events failed, retrying in %ds: %s",
+                    retry_delay,
+                    e,
+                )
+            # Events sent until we listen again are lost, they can't be
+            # replayed
+            self._buffer.clear()
+            for subscriber in list(self._subscribers):
+                self._send(subscriber, _RESET)
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, MAX_LISTEN_RETRY_DELAY)
+
+    def _publish(self, event: TicketEvent):
+        self._buffer.append(event)
+        for subscriber in list(self._subscribers):
+            self._send(subscriber, event)
+
+    def _send(self, subscriber: _Subscriber, item: TicketEvent | object):
+        try:
+            subscriber.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # The client does not keep up: the stream is closed once its
+            # queued events are sent, the client resumes it from the buffer
+            TICKET_EVENT_OVERFLOWS.inc()
+            self._close(subscriber)
+
+    def _close(self, subscriber: _Subscriber):
+        self._unsubscribe(subscriber)
+        subscriber.closed = True
+        if subscriber.queue.empty():
+            subscriber.queue.put_nowait(_CLOSE)
+
+    def _unsubscribe(self, subscriber: _Subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+            TICKET_EVENT_SUBSCRIBERS.dec()
+
+    def _replay(self, last_event_id: str | None) -> list[TicketEvent] | None:
+        """Return the buffered events following the event `last_event_id`,
+        or None if the event is not in the buffer."""
+        if last_event_id is None:
+            return []
+        for i, event in enumerate(self._buffer):
+            if str(event.id) == last_event_id:
+                return list(self._buffer)[i + 1 :]
+        return None
+
+    async def stream(self, last_event_id: str | None = None) -> AsyncIterator[str]:
+        """Yield the Server-Sent Events messages of the events, starting after
+        the event `last_event_id` if it is given.
+
+        The stream ends after `ticket_events_max_duration` seconds, or when
+        the client does not keep up.
+        """
+        subscriber = _Subscriber(self.queue_size)
+        # No event can be published between the replay and the subscription
+        replay = self._replay(last_event_id)
+        self._subscribers.add(subscriber)
+        TICKET_EVENT_SUBSCRIBERS.inc()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ticket_events_max_duration
+        try:
+            yield f"retry: {RECONNECT_DELAY}\n\n"
+            if replay is None:
+                yield _RESET_MESSAGE
+            else:
+                for event in replay:
+                    yield _format(event)
+            while (timeout := deadline - loop.time()) > 0:
+                if subscriber.closed and subscriber.queue.empty():
+                    return
+                try:
+                    item = await asyncio.wait_for(
+                        subscriber.queue.get(),
+                        min(timeout, settings.ticket_events_heartbeat),
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is _CLOSE:
+                    return
+                if item is _RESET:
+                    yield _RESET_MESSAGE
+                else:
+                    yield _format(item)
+        finally:
+            self._unsubscribe(subscriber)
+
+
+broker = TicketEventBroker(
+    settings.ticket_events_buffer_size, settings.ticket_events_queue_size
+)
@@ -1,4 +1,7 @@
 import logging
+from datetime import date
+from typing import Any
+from uuid import UUID
 
 import sentry_sdk
 from sentry_sdk.integrations import Integration
@@ -7,7 +10,11 @@ from sentry_sdk.integrations.logging import LoggingIntegration
 from app.config import settings
 
 
-def init_sentry(sentry_dsn: str | None, integrations: list[Integration] | None = None):
+def init_sentry(
+    sentry_dsn: str | None,
+    integrations: list[Integration] | None = None,
+    traces_sample_rate: float = 0,
+):
     if sentry_dsn:
         integrations = integrations or []
         integrations.append(
@@ -20,4 +27,15 @@ def init_sentry(sentry_dsn: str | None, integrations: list[Integration] | None =
             sentry_dsn,
             integrations=integrations,
             environment=settings.environment,
+            traces_sample_rate=traces_sample_rate,
         )
+
+
+def json_default(value: Any) -> Any:
+    """JSON encoder of the values returned by the database that are not
+    JSON serializable (dates, UUIDs), to use as `default` of `json.dumps`."""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
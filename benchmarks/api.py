@@ -0,0 +1,331 @@
+"""Load test the API with a mixed read/write workload.
+
+The API is started with uvicorn against the database configured through the
+usual POSTGRES_* environment variables, with a stub auth server (see
+`benchmarks.stub_auth`) replacing the Open Food Facts one, so that results
+only depend on the API and the database. An already running API can be
+targeted instead with --url (it must use the stub auth server).
+
+The database should already contain tickets and flags, at least a million
+rows for realistic numbers (see the `seed` command). For each concurrency
+level, requests are sent in a closed loop for --duration seconds (after
+--warmup seconds whose requests are not measured), each request going to a
+route drawn according to --mix. Throughput and latency percentiles are
+reported by route, as JSON, along with the commit of the tree, so that runs
+can be compared across commits. Note that `create_flag` requests add flags
+(and tickets) to the database. Usage:
+
+    python -m benchmarks.api --concurrency 10 --concurrency 100 \\
+        --duration 30 --output api.json
+"""
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+import httpx
+import typer
+from peewee import fn
+
+from app.models import TicketModel, db
+
+app = typer.Typer()
+
+# Relative weight of each route in the default workload
+DEFAULT_MIX = ["create_flag=2", "get_tickets=5", "flags_batch=2", "stats=1"]
+DEFAULT_MIX_ROUTES = [item.partition("=")[0] for item in DEFAULT_MIX]
+
+REASONS = ["inappropriate", "human", "beauty", "other"]
+
+
+class Workload:
+    """Requests of the benchmarked routes, built from a sample of the
+    tickets of the database."""
+
+    def __init__(self, rng: random.Random, sample_size: int, n_users: int):
+        self.rng = rng
+        self.run_id = uuid.uuid4().hex[:8]
+        self.n_users = n_users
+        with db:
+            sample = list(
+                TicketModel.select(TicketModel.id, TicketModel.barcode)
+                .order_by(fn.random())
+                .limit(sample_size)
+            )
+        if not sample:
+            raise typer.BadParameter("the database must contain tickets")
+        self.ticket_ids = [ticket.id for ticket in sample]
+        self.barcodes = [ticket.barcode for ticket in sample if ticket.barcode]
+        self.n_flags = 0
+
+    def _cookie(self, prefix: str) -> dict:
+        return {"Cookie": f"session={prefix}-{self.rng.randrange(self.n_users)}"}
+
+    def create_flag(self) -> tuple[str, str, dict]:
+        self.n_flags += 1
+        # Most flags are about already flagged products
+        if self.barcodes and self.rng.random() < 0.8:
+            barcode = self.rng.choice(self.barcodes)
+        else:
+            barcode = str(self.rng.randrange(10**12, 10**13))
+        return (
+            "POST",
+            "/api/v1/flags",
+            dict(
+                headers=self._cookie("user"),
+                json={
+                    "barcode": barcode,
+                    "type": "product",
+                    "flavor": "off",
+                    # Unique users, so that flags are never duplicates
+                    "user_id": f"benchmark-{self.run_id}-{self.n_flags}",
+                    "source": "web",
+                    "reason": self.rng.choice(REASONS),
+                },
+            ),
+        )
+
+    def get_tickets(self) -> tuple[str, str, dict]:
+        params: dict = {
+            "status": "open",
+            "order_by": self.rng.choice(["created_at", "flag_count"]),
+        }
+        if self.rng.random() < 0.2:
+            params["reason"] = self.rng.choice(REASONS)
+        return (
+            "GET",
+            "/api/v1/tickets",
+            dict(headers=self._cookie("moderator"), params=params),
+        )
+
+    def flags_batch(self) -> tuple[str, str, dict]:
+        ticket_ids = self.rng.sample(self.ticket_ids, min(10, len(self.ticket_ids)))
+        return (
+            "POST",
+            "/api/v1/flags/batch",
+            dict(headers=self._cookie("moderator"), json={"ticket_ids": ticket_ids}),
+        )
+
+    def stats(self) -> tuple[str, str, dict]:
+        return (
+            "GET",
+            "/api/v1/stats",
+            dict(headers=self._cookie("moderator"), params={"n_days": 31}),
+        )
+
+
+def _parse_mix(mix: list[str]) -> dict[str, int]:
+    weights = {}
+    for item in mix:
+        route, _, weight = item.partition("=")
+        if route not in DEFAULT_MIX_ROUTES or not weight.isdigit():
+            raise typer.BadParameter(
+                f"invalid mix item {item!r}, expected ROUTE=WEIGHT with ROUTE in "
+                f"{', '.join(DEFAULT_MIX_ROUTES)}"
+            )
+        weights[route] = int(weight)
+    return weights
+
+
+def _percentile(latencies: list[float], q: float) -> float:
+    """Return the `q` percentile of the sorted latencies, in milliseconds."""
+    index = min(len(latencies) - 1, max(0, int(len(latencies) * q) - 1))
+    return round(latencies[index] * 1000, 2)
+
+
+def _summary(latencies: list[float], errors: int, duration: float) -> dict:
+    latencies = sorted(latencies)
+    summary: dict = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "requests_per_second": round((len(latencies) + errors) / duration, 1),
+    }
+    if latencies:
+        summary.update(
+            p50_ms=_percentile(latencies, 0.5),
+            p95_ms=_percentile(latencies, 0.95),
+            p99_ms=_percentile(latencies, 0.99),
+        )
+    return summary
+
+
+async def _run_level(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    weights: dict[str, int],
+    concurrency: int,
+    warmup: float,
+    duration: float,
+) -> dict:
+    routes = list(weights)
+    route_weights = list(weights.values())
+    makers: dict[str, Callable] = {route: getattr(workload, route) for route in routes}
+    latencies: dict[str, list[float]] = {route: [] for route in routes}
+    errors: dict[str, int] = {route: 0 for route in routes}
+    start = time.perf_counter()
+    measure_from = start + warmup
+    end = measure_from + duration
+
+    async def worker():
+        while (now := time.perf_counter()) < end:
+            route = workload.rng.choices(routes, weights=route_weights)[0]
+            method, path, kwargs = makers[route]()
+            try:
+                response = await client.request(method, path, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if now < measure_from:
+                continue
+            if failed:
+                errors[route] += 1
+            else:
+                latencies[route].append(time.perf_counter() - now)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {
+        "total": _summary(
+            [latency for values in latencies.values() for latency in values],
+            sum(errors.values()),
+            duration,
+        ),
+        "routes": {
+            route: _summary(latencies[route], errors[route], duration)
+            for route in routes
+        },
+    }
+
+
+async def _benchmark(
+    url: str,
+    workload: Workload,
+    weights: dict[str, int],
+    concurrency: list[int],
+    warmup: float,
+    duration: float,
+) -> dict:
+    results = {}
+    limits = httpx.Limits(max_connections=max(concurrency))
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        for level in concurrency:
+            results[str(level)] = await _run_level(
+                client, workload, weights, level, warmup, duration
+            )
+    return results
+
+
+def _start(args: list[str], env: dict, ready_url: str) -> subprocess.Popen:
+    """Start a server with uvicorn, and wait until `ready_url` answers."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", *args, "--log-level", "warning"], env=env
+    )
+    for _ in range(100):
+        try:
+            httpx.get(ready_url, timeout=1)
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server {' '.join(args)} did not start")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@app.command()
+def main(
+    concurrency: list[int] = typer.Option(
+        [10, 50], help="Number of requests in flight, can be repeated"
+    ),
+    duration: float = typer.Option(30, help="Measured duration of each level, in s"),
+    warmup: float = typer.Option(5, help="Unmeasured warmup of each level, in s"),
+    mix: list[str] = typer.Option(
+        DEFAULT_MIX, help="Weight of a route in the workload, as ROUTE=WEIGHT"
+    ),
+    url: Optional[str] = typer.Option(
+        None, help="URL of a running API, instead of starting one"
+    ),
+    port: int = typer.Option(8765, help="Port of the started API"),
+    workers: int = typer.Option(1, help="Number of uvicorn workers of the API"),
+    auth_port: int = typer.Option(8766, help="Port of the stub auth server"),
+    auth_latency: float = typer.Option(
+        0, help="Simulated latency of the auth server, in s"
+    ),
+    users: int = typer.Option(100, help="Number of distinct sessions"),
+    sample_size: int = typer.Option(
+        10000, help="Number of tickets the requests are built from"
+    ),
+    seed: int = typer.Option(0, help="Seed of the workload"),
+    output: Optional[Path] = typer.Option(None, help="Write results to this file"),
+):
+    """Load test the API with a mixed read/write workload."""
+    weights = _parse_mix(mix)
+    workload = Workload(random.Random(seed), sample_size, users)
+    processes = []
+    try:
+        if url is None:
+            env = dict(os.environ, STUB_AUTH_LATENCY=str(auth_latency))
+            processes.append(
+                _start(
+                    ["benchmarks.stub_auth:app", "--port", str(auth_port)],
+                    env,
+                    f"http://127.0.0.1:{auth_port}/",
+                )
+            )
+            env["AUTH_SERVER_STATIC"] = f"http://127.0.0.1:{auth_port}"
+            url = f"http://127.0.0.1:{port}"
+            processes.append(
+                _start(
+                    ["app.api:app", "--port", str(port), "--workers", str(workers)],
+                    env,
+                    f"{url}/api/v1/status",
+                )
+            )
+        results = asyncio.run(
+            _benchmark(url, workload, weights, concurrency, warmup, duration)
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    content = json.dumps(
+        {
+            "commit": _git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(),
+            "parameters": {
+                "mix": weights,
+                "duration": duration,
+                "warmup": warmup,
+                "workers": workers,
+                "auth_latency": auth_latency,
+                "users": users,
+                "seed": seed,
+            },
+            "results": results,
+        },
+        indent=2,
+    )
+    if output:
+        output.write_text(content)
+    typer.echo(content)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,302 @@
+"""Compare the sync (peewee in the threadpool) and async (psycopg) data access
+paths on the queries of the request hot paths.
+
+The sync path runs each call in the anyio worker threadpool, exactly like
+FastAPI does for `def` endpoints, so its concurrency is capped by the
+threadpool size (40 threads by default). The async path runs the same peewee
+queries through `app.models.async_db`.
+
+The database configured through the usual POSTGRES_* environment variables
+is used, it should already contain tickets and flags. The `create_flag`
+workload runs the statements of `POST /flags`: it creates flags and reopens
+tickets, use a test database filled with the `seed` command. Usage:
+
+    python -m benchmarks.async_db --requests 2000 --concurrency 10 \\
+        --concurrency 100 --concurrency 400 --output async_db.json
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+import anyio
+import typer
+from peewee import SQL, fn
+
+from app import ticket_aggregates
+from app.models import FlagModel, TicketModel, async_db, db
+from app.response_cache import invalidate, invalidate_async
+from app.stats import TicketStatsDelta
+from app.ticket_events import TicketEvent, TicketEventType, notify, notify_async
+
+app = typer.Typer()
+
+
+def _tickets_queries():
+    query = TicketModel.select().where(TicketModel.status == "open")
+    return [
+        query.select(fn.COUNT(TicketModel.id)),
+        query.order_by(TicketModel.created_at.desc()).limit(10).dicts(),
+    ]
+
+
+def _flags_batch_queries(ticket_ids: list[int]):
+    return [FlagModel.select().where(FlagModel.ticket_id.in_(ticket_ids)).dicts()]
+
+
+def _new_flag(flag: FlagModel) -> dict:
+    """Return the fields of a new flag of the ticket of `flag`, by a new
+    user, so that the flag is created."""
+    return dict(
+        barcode=flag.barcode,
+        type=flag.type,
+        url=flag.url,
+        url_hash=flag.url_hash,
+        user_id=f"benchmark-{uuid.uuid4().hex[:8]}",
+        device_id=flag.device_id,
+        source=flag.source,
+        confidence=flag.confidence,
+        image_id=flag.image_id,
+        flavor=flag.flavor,
+        reason=flag.reason,
+        created_at=datetime.utcnow(),
+    )
+
+
+# The statements of `create_flag` (see `app.api`)
+
+
+def _ticket_key(flag: dict):
+    return (
+        TicketModel.barcode == flag["barcode"],
+        TicketModel.url_hash == flag["url_hash"],
+        TicketModel.type == flag["type"],
+        TicketModel.flavor == flag["flavor"],
+    )
+
+
+def _ticket_upsert_query(flag: dict):
+    return (
+        TicketModel.insert(
+            barcode=flag["barcode"],
+            type=flag["type"],
+            url=flag["url"],
+            url_hash=flag["url_hash"],
+            status="open",
+            image_id=flag["image_id"],
+            flavor=flag["flavor"],
+            created_at=flag["created_at"],
+        )
+        .on_conflict(
+            conflict_target=[
+                TicketModel.barcode,
+                TicketModel.url_hash,
+                TicketModel.type,
+                TicketModel.flavor,
+            ],
+            update={TicketModel.status: "open"},
+            where=TicketModel.status != "open",
+        )
+        .returning(TicketModel, SQL("xmax = 0").alias("inserted"))
+    )
+
+
+def _ticket_stats(ticket: TicketModel) -> TicketStatsDelta:
+    stats = TicketStatsDelta()
+    if ticket.inserted:
+        stats.add(ticket)
+    else:
+        stats.move(ticket, "closed", "open")
+    return stats
+
+
+def _flag_insert_query(flag: dict, ticket: TicketModel):
+    return (
+        FlagModel.insert(ticket=ticket, **flag)
+        .on_conflict_ignore()
+        .returning(FlagModel)
+    )
+
+
+def _events(ticket: TicketModel, flag: FlagModel, ticket_changed: bool) -> list:
+    events = []
+    if ticket_changed:
+        events.append(
+            TicketEvent(
+                type=(
+                    TicketEventType.ticket_created
+                    if ticket.inserted
+                    else TicketEventType.status_changed
+                ),
+                ticket_id=ticket.id,
+                status=ticket.status,
+            )
+        )
+    events.append(
+        TicketEvent(
+            type=TicketEventType.flag_added,
+            ticket_id=ticket.id,
+            status=ticket.status,
+            flag_id=flag.id,
+        )
+    )
+    return events
+
+
+def _create_flag_sync(flag: dict) -> None:
+    with db:
+        ticket = next(iter(_ticket_upsert_query(flag).execute()), None)
+        # The ticket was created or reopened
+        if ticket_changed := ticket is not None:
+            _ticket_stats(ticket).apply()
+        else:
+            ticket = TicketModel.get(*_ticket_key(flag))
+        created_flag = next(iter(_flag_insert_query(flag, ticket).execute()))
+        # `ticket_aggregates.add_flags` only runs on the async database
+        db.execute_sql(ticket_aggregates._ADD_FLAGS_SQL, ([created_flag.id],))
+        notify(_events(ticket, created_flag, ticket_changed))
+    with db.connection_context():
+        invalidate()
+
+
+async def _create_flag_async(flag: dict) -> None:
+    async with async_db.atomic() as session:
+        ticket = await session.fetchone(_ticket_upsert_query(flag))
+        if ticket_changed := ticket is not None:
+            await session.execute(_ticket_stats(ticket).query())
+        else:
+            ticket = await session.fetchone(
+                TicketModel.select().where(*_ticket_key(flag))
+            )
+        created_flag = await session.fetchone(_flag_insert_query(flag, ticket))
+        await ticket_aggregates.add_flags(session, [created_flag.id])
+        await notify_async(session, _events(ticket, created_flag, ticket_changed))
+    await invalidate_async()
+
+
+def _run_sync(queries) -> None:
+    with db:
+        for query in queries:
+            list(query)
+
+
+async def _run_async(queries) -> None:
+    async with async_db.atomic() as session:
+        for query in queries:
+            await session.fetchall(query)
+
+
+async def _measure(
+    call: Callable, make_args: Callable, n_requests: int, concurrency: int
+) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        args = make_args()
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(args)
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "requests_per_second": round(n_requests / elapsed, 1),
+        # No latency if all the requests failed
+        "p50_ms": (
+            round(statistics.median(latencies) * 1000, 2) if latencies else None
+        ),
+        "p99_ms": (
+            round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+            if latencies
+            else None
+        ),
+    }
+
+
+async def _benchmark(n_requests: int, concurrency: list[int], seed: int) -> dict:
+    rng = random.Random(seed)
+    with db:
+        ticket_ids = [t.id for t in TicketModel.select(TicketModel.id).limit(10000)]
+        # One flag per ticket, so that the requests of the create_flag
+        # workload do not all wait for the lock of the same ticket
+        flags = list(
+            FlagModel.select()
+            .distinct(FlagModel.ticket)
+            .order_by(FlagModel.ticket)
+            .limit(1000)
+        )
+    if not ticket_ids or not flags:
+        raise typer.BadParameter("the database must contain tickets and flags")
+
+    # Arguments of each request, and the sync and async functions running it
+    workloads = {
+        "get_tickets": (_tickets_queries, _run_sync, _run_async),
+        "get_flags_by_ticket_batch": (
+            lambda: _flags_batch_queries(
+                rng.sample(ticket_ids, min(10, len(ticket_ids)))
+            ),
+            _run_sync,
+            _run_async,
+        ),
+        "create_flag": (
+            lambda: _new_flag(rng.choice(flags)),
+            _create_flag_sync,
+            _create_flag_async,
+        ),
+    }
+
+    await async_db.open()
+    results: dict = {}
+    try:
+        for name, (make_args, run_sync, run_async) in workloads.items():
+
+            async def sync_call(args, run_sync=run_sync):
+                await anyio.to_thread.run_sync(run_sync, args)
+
+            for level in concurrency:
+                results.setdefault(name, {})[str(level)] = {
+                    "sync": await _measure(sync_call, make_args, n_requests, level),
+                    "async": await _measure(run_async, make_args, n_requests, level),
+                }
+    finally:
+        await async_db.close()
+    return results
+
+
+@app.command()
+def main(
+    requests: int = typer.Option(1000, help="Number of requests per run"),
+    concurrency: list[int] = typer.Option(
+        [10, 100], help="Number of requests in flight, can be repeated"
+    ),
+    seed: int = typer.Option(0, help="Seed used to pick tickets and flags"),
+    output: Optional[Path] = typer.Option(None, help="Write results to this file"),
+):
+    """Benchmark the sync and async data access paths."""
+    results = asyncio.run(_benchmark(requests, concurrency, seed))
+    content = json.dumps(results, indent=2)
+    if output:
+        output.write_text(content)
+    typer.echo(content)
+
+
+if __name__ == "__main__":
+    app()
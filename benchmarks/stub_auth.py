@@ -0,0 +1,32 @@
+"""Stand-in for the Open Food Facts auth server, used by the API benchmark.
+
+Sessions are valid if their cookie starts with `moderator-` (moderators) or
+`user-` (other users). The latency of the real auth server can be simulated
+with the STUB_AUTH_LATENCY environment variable, in seconds. Usage:
+
+    uvicorn benchmarks.stub_auth:app --port 8766
+
+and run the API with AUTH_SERVER_STATIC=http://localhost:8766.
+"""
+
+import asyncio
+import os
+
+from fastapi import FastAPI, Request, Response
+
+app = FastAPI()
+
+LATENCY = float(os.getenv("STUB_AUTH_LATENCY", "0"))
+
+
+@app.get("/{path:path}")
+async def auth(request: Request, response: Response):
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    session = request.cookies.get("session", "")
+    if session.startswith("moderator-"):
+        return {"user": {"userid": session, "moderator": 1}}
+    if session.startswith("user-"):
+        return {"user": {"userid": session, "moderator": 0}}
+    response.status_code = 403
+    return {"error": "Invalid session"}
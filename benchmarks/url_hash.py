@@ -0,0 +1,126 @@
+"""Compare the unique index on the ticket identity keyed on the full URL
+(barcode, url, type, flavor) with the one keyed on the URL hash (barcode,
+url_hash, type, flavor): index size and latency of the ticket lookup done
+when a flag is created.
+
+Each variant is built in a transaction that replaces the identity index and
+is rolled back at the end, so the database is left unchanged. The tickets
+table is locked meanwhile: use a test database, not the production one.
+
+The database configured through the usual POSTGRES_* environment variables
+is used, it should already contain tickets. Usage:
+
+    python -m benchmarks.url_hash --lookups 5000 --output url_hash.json
+"""
+
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+from app.models import TicketModel, db, url_hash
+
+app = typer.Typer()
+
+IDENTITY_INDEX = "tickets_barcode_url_hash_type_flavor"
+BENCHMARK_INDEX = "benchmark_ticket_identity"
+
+
+def _lookup_query(ticket: TicketModel, column: str):
+    if column == "url":
+        url_condition = TicketModel.url == ticket.url
+    else:
+        url_condition = TicketModel.url_hash == url_hash(ticket.url)
+    return TicketModel.select(TicketModel.id).where(
+        TicketModel.barcode == ticket.barcode,
+        url_condition,
+        TicketModel.type == ticket.type,
+        TicketModel.flavor == ticket.flavor,
+    )
+
+
+def _measure(column: str, tickets: list[TicketModel], n_lookups: int) -> dict:
+    rng = random.Random(0)
+    with db.atomic() as transaction:
+        db.execute_sql(f"DROP INDEX {IDENTITY_INDEX}")
+        db.execute_sql(
+            f"CREATE UNIQUE INDEX {BENCHMARK_INDEX} "
+            f"ON tickets (barcode, {column}, type, flavor) NULLS NOT DISTINCT"
+        )
+        db.execute_sql("ANALYZE tickets")
+        index_size = db.execute_sql(
+            "SELECT pg_relation_size(%s::regclass)", (BENCHMARK_INDEX,)
+        ).fetchone()[0]
+        sql, params = _lookup_query(tickets[0], column).sql()
+        plan = "\n".join(
+            row[0] for row in db.execute_sql(f"EXPLAIN {sql}", params).fetchall()
+        )
+
+        queries = [
+            _lookup_query(rng.choice(tickets), column).sql() for _ in range(n_lookups)
+        ]
+        latencies = []
+        for sql, params in queries:
+            start = time.perf_counter()
+            db.execute_sql(sql, params).fetchall()
+            latencies.append(time.perf_counter() - start)
+        transaction.rollback()
+
+    latencies.sort()
+    return {
+        "index_size_bytes": index_size,
+        "index_used": BENCHMARK_INDEX in plan,
+        "lookups": n_lookups,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def _benchmark(n_lookups: int, sample_size: int) -> dict:
+    with db:
+        n_tickets, avg_url_size = db.execute_sql(
+            "SELECT count(*), avg(pg_column_size(url)) FROM tickets"
+        ).fetchone()
+        if not n_tickets:
+            raise typer.BadParameter("the database must contain tickets")
+        tickets = list(
+            TicketModel.select(
+                TicketModel.barcode,
+                TicketModel.url,
+                TicketModel.type,
+                TicketModel.flavor,
+            )
+            .order_by(TicketModel.id)
+            .limit(sample_size)
+        )
+        results = {
+            "tickets": n_tickets,
+            "avg_url_bytes": round(float(avg_url_size), 1),
+        }
+        for column in ("url", "url_hash"):
+            results[column] = _measure(column, tickets, n_lookups)
+    return results
+
+
+@app.command()
+def main(
+    lookups: int = typer.Option(5000, help="Number of lookups per variant"),
+    sample_size: int = typer.Option(
+        10000, help="Number of tickets the lookups are picked from"
+    ),
+    output: Optional[Path] = typer.Option(None, help="Write results to this file"),
+):
+    """Benchmark the ticket identity index keyed on the URL or its hash."""
+    results = _benchmark(lookups, sample_size)
+    content = json.dumps(results, indent=2)
+    if output:
+        output.write_text(content)
+    typer.echo(content)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,75 @@
+"""Peewee migrations -- 002_ticket_flag_identity.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add unique indexes on the ticket identity (barcode, url, type, flavor)
+    and on the flag deduplication key (ticket_id, user_id, reason).
+
+    NULL values are considered equal, as search tickets have no barcode and
+    flags may have no reason. Existing duplicates are merged first: tickets
+    are merged into the oldest one (which is reopened if any of the merged
+    tickets was open), and duplicate flags are removed.
+    """
+    migrator.sql(
+        """
+        CREATE TEMPORARY TABLE ticket_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id
+        FROM (
+            SELECT id, min(id) OVER (PARTITION BY barcode, url, type, flavor) AS keep_id
+            FROM tickets
+        ) AS t
+        WHERE id <> keep_id
+        """
+    )
+    migrator.sql(
+        """
+        UPDATE tickets SET status = 'open'
+        WHERE id IN (
+            SELECT d.keep_id
+            FROM ticket_duplicates d JOIN tickets t ON t.id = d.id
+            WHERE t.status = 'open'
+        )
+        """
+    )
+    migrator.sql(
+        """
+        UPDATE flags SET ticket_id = d.keep_id
+        FROM ticket_duplicates d WHERE flags.ticket_id = d.id
+        """
+    )
+    migrator.sql(
+        """
+        UPDATE moderator_actions SET ticket_id = d.keep_id
+        FROM ticket_duplicates d WHERE moderator_actions.ticket_id = d.id
+        """
+    )
+    migrator.sql("DELETE FROM tickets WHERE id IN (SELECT id FROM ticket_duplicates)")
+    migrator.sql(
+        """
+        DELETE FROM flags
+        USING flags AS older
+        WHERE flags.ticket_id = older.ticket_id
+            AND flags.user_id = older.user_id
+            AND flags.reason IS NOT DISTINCT FROM older.reason
+            AND older.id < flags.id
+        """
+    )
+    migrator.sql(
+        "CREATE UNIQUE INDEX tickets_barcode_url_type_flavor "
+        "ON tickets (barcode, url, type, flavor) NULLS NOT DISTINCT"
+    )
+    migrator.sql(
+        "CREATE UNIQUE INDEX flags_ticket_id_user_id_reason "
+        "ON flags (ticket_id, user_id, reason) NULLS NOT DISTINCT"
+    )
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP INDEX flags_ticket_id_user_id_reason")
+
+    migrator.sql("DROP INDEX tickets_barcode_url_type_flavor")
@@ -0,0 +1,21 @@
+"""Peewee migrations -- 003_ticket_listing_indexes.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add indexes matching the (created_at, id) ordering of ticket listings,
+    used for cursor pagination."""
+
+    migrator.add_index("tickets", "created_at", "id", unique=False)
+
+    migrator.add_index("tickets", "status", "created_at", "id", unique=False)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.drop_index("tickets", "status", "created_at", "id")
+
+    migrator.drop_index("tickets", "created_at", "id")
@@ -0,0 +1,17 @@
+"""Peewee migrations -- 004_flags_created_at_index.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add an index on the flag creation date, used to export flags by date
+    range."""
+
+    migrator.add_index("flags", "created_at", unique=False)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.drop_index("flags", "created_at")
@@ -0,0 +1,36 @@
+"""Peewee migrations -- 005_ticket_daily_stats.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the daily ticket statistics rollup table, and fill it from the
+    existing tickets."""
+
+    @migrator.create_model
+    class TicketDailyStatsModel(pw.Model):
+        day = pw.DateField()
+        status = pw.CharField(max_length=50)
+        flavor = pw.CharField(max_length=20)
+        type = pw.CharField(max_length=50)
+        n_tickets = pw.IntegerField()
+
+        class Meta:
+            table_name = "ticket_daily_stats"
+            primary_key = pw.CompositeKey("day", "status", "flavor", "type")
+
+    migrator.sql(
+        """
+        INSERT INTO ticket_daily_stats (day, status, flavor, type, n_tickets)
+        SELECT created_at::date, status, flavor, type, count(*)
+        FROM tickets
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.remove_model("ticket_daily_stats")
@@ -0,0 +1,87 @@
+"""Peewee migrations -- 006_ticket_aggregates.py."""
+
+import peewee as pw
+import playhouse.postgres_ext as pw_pext
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the aggregates of the flags of each ticket (number of flags,
+    distinct reasons and sources, maximum confidence, last flag date), and
+    compute them from the existing flags."""
+
+    # Columns are added as nullable with a database default, which fills the
+    # existing rows, then made non-nullable
+    migrator.add_fields(
+        "tickets",
+        flag_count=pw.IntegerField(
+            default=0, null=True, constraints=[pw.SQL("DEFAULT 0")]
+        ),
+        reasons=pw_pext.ArrayField(
+            pw.TextField,
+            default=list,
+            null=True,
+            # GIN index (tickets_reasons)
+            index=True,
+            constraints=[pw.SQL("DEFAULT '{}'")],
+        ),
+        sources=pw_pext.ArrayField(
+            pw.TextField,
+            default=list,
+            null=True,
+            index=False,
+            constraints=[pw.SQL("DEFAULT '{}'")],
+        ),
+        max_confidence=pw.FloatField(null=True),
+        last_flagged_at=pw.DateTimeField(null=True),
+    )
+    # `add_not_null` also applies to the field given to the queued
+    # `add_fields`, so the columns are added first
+    if not fake:
+        migrator()
+    migrator.add_not_null("tickets", "flag_count", "reasons", "sources")
+    migrator.sql(
+        """
+        UPDATE tickets SET
+            flag_count = agg.flag_count,
+            reasons = agg.reasons,
+            sources = agg.sources,
+            max_confidence = agg.max_confidence,
+            last_flagged_at = agg.last_flagged_at
+        FROM (
+            SELECT
+                ticket_id,
+                count(*) AS flag_count,
+                coalesce(
+                    array_agg(DISTINCT reason ORDER BY reason)
+                    FILTER (WHERE reason IS NOT NULL),
+                    '{}'
+                ) AS reasons,
+                array_agg(DISTINCT source::text ORDER BY source::text) AS sources,
+                max(confidence) AS max_confidence,
+                max(created_at) AS last_flagged_at
+            FROM flags
+            GROUP BY ticket_id
+        ) AS agg
+        WHERE tickets.id = agg.ticket_id
+        """
+    )
+    migrator.add_index("tickets", "flag_count", "id", unique=False)
+    migrator.add_index("tickets", "status", "flag_count", "id", unique=False)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.drop_index("tickets", "status", "flag_count", "id")
+
+    migrator.drop_index("tickets", "flag_count", "id")
+
+    migrator.remove_fields(
+        "tickets",
+        "flag_count",
+        "reasons",
+        "sources",
+        "max_confidence",
+        "last_flagged_at",
+    )
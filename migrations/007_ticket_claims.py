@@ -0,0 +1,28 @@
+"""Peewee migrations -- 007_ticket_claims.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the claim (lease) of tickets by moderators, and an index on the
+    queue of open tickets, in claim order."""
+
+    migrator.add_fields(
+        "tickets",
+        claimed_by=pw.TextField(null=True),
+        claimed_until=pw.DateTimeField(null=True),
+    )
+    # Partial index, which the migrator can't create
+    migrator.sql(
+        "CREATE INDEX tickets_claim_queue ON tickets (flag_count DESC, id) "
+        "WHERE status = 'open'"
+    )
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP INDEX tickets_claim_queue")
+
+    migrator.remove_fields("tickets", "claimed_by", "claimed_until")
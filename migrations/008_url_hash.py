@@ -0,0 +1,45 @@
+"""Peewee migrations -- 008_url_hash.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add a fixed-width hash of the URL (`md5(url)::uuid`) to tickets and
+    flags, and use it instead of the URL in the unique index on the ticket
+    identity, which is much smaller."""
+
+    for table in ("tickets", "flags"):
+        migrator.add_fields(table, url_hash=pw.UUIDField(null=True))
+        migrator.sql(f"UPDATE {table} SET url_hash = md5(url)::uuid")
+        # `add_not_null` also applies to the field given to the queued
+        # `add_fields`, so the columns are added first
+        if not fake:
+            migrator()
+        migrator.add_not_null(table, "url_hash")
+        migrator.sql(
+            f"""
+            ALTER TABLE {table} ADD CONSTRAINT {table}_url_hash_check
+                CHECK (url_hash = md5(url)::uuid)
+            """
+        )
+    migrator.sql(
+        "CREATE UNIQUE INDEX tickets_barcode_url_hash_type_flavor "
+        "ON tickets (barcode, url_hash, type, flavor) NULLS NOT DISTINCT"
+    )
+    migrator.sql("DROP INDEX tickets_barcode_url_type_flavor")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql(
+        "CREATE UNIQUE INDEX tickets_barcode_url_type_flavor "
+        "ON tickets (barcode, url, type, flavor) NULLS NOT DISTINCT"
+    )
+
+    migrator.sql("DROP INDEX tickets_barcode_url_hash_type_flavor")
+
+    migrator.remove_fields("flags", "url_hash")
+
+    migrator.remove_fields("tickets", "url_hash")
@@ -0,0 +1,20 @@
+"""Peewee migrations -- 009_response_cache_version.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the version counter of the response cache, incremented by writes
+    to invalidate the cached responses (see app/response_cache.py)."""
+
+    migrator.sql("CREATE SEQUENCE response_cache_version")
+    # The last value of a new sequence only changes on the second call of
+    # nextval, call it once so that each increment changes the version
+    migrator.sql("SELECT nextval('response_cache_version')")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP SEQUENCE response_cache_version")
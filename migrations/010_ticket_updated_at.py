@@ -0,0 +1,56 @@
+"""Peewee migrations -- 010_ticket_updated_at.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the last update date of tickets, set by a trigger on each change
+    of the ticket (including its flag aggregates), and an index used to
+    compute the ETags of ticket listings."""
+
+    migrator.add_fields(
+        "tickets",
+        updated_at=pw.DateTimeField(
+            null=True, constraints=[pw.SQL("DEFAULT (now() AT TIME ZONE 'UTC')")]
+        ),
+    )
+    migrator.sql(
+        "UPDATE tickets SET updated_at = greatest(created_at, last_flagged_at)"
+    )
+    # `add_not_null` also applies to the field given to the queued
+    # `add_fields`, so the columns are added first
+    if not fake:
+        migrator()
+    migrator.add_not_null("tickets", "updated_at")
+    # The clock time is used instead of the transaction start time, so that
+    # successive updates of a ticket get distinct dates
+    migrator.sql(
+        """
+        CREATE FUNCTION tickets_set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at = clock_timestamp() AT TIME ZONE 'UTC';
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # Updates that do not change the row (e.g. the no-op upserts of
+    # /flags/bulk) leave the date untouched
+    migrator.sql(
+        """
+        CREATE TRIGGER tickets_updated_at BEFORE UPDATE ON tickets
+        FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+        EXECUTE FUNCTION tickets_set_updated_at()
+        """
+    )
+    migrator.add_index("tickets", "status", "updated_at", unique=False)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.drop_index("tickets", "status", "updated_at")
+    migrator.sql("DROP TRIGGER tickets_updated_at ON tickets")
+    migrator.sql("DROP FUNCTION tickets_set_updated_at()")
+    migrator.remove_fields("tickets", "updated_at")
@@ -0,0 +1,17 @@
+"""Peewee migrations -- 011_ticket_event_id.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the sequence of the IDs of ticket events (see
+    app/ticket_events.py)."""
+
+    migrator.sql("CREATE SEQUENCE ticket_event_id")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP SEQUENCE ticket_event_id")
@@ -0,0 +1,34 @@
+"""Peewee migrations -- 012_inserted_at.py."""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+TABLES = ("tickets", "flags", "moderator_actions")
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the insertion date of tickets, flags and moderator actions, set by
+    the database, used for the high-water marks of incremental exports (see
+    app/export.py)."""
+
+    # The start time of the inserting transaction. Existing rows get the
+    # date of the migration
+    for table in TABLES:
+        migrator.add_fields(
+            table,
+            inserted_at=pw.DateTimeField(
+                null=True, constraints=[pw.SQL("DEFAULT (now() AT TIME ZONE 'UTC')")]
+            ),
+        )
+        # `add_not_null` also applies to the field given to the queued
+        # `add_fields`, so the columns are added first
+        if not fake:
+            migrator()
+        migrator.add_not_null(table, "inserted_at")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    for table in TABLES:
+        migrator.remove_fields(table, "inserted_at")
@@ -0,0 +1,394 @@
+"""Query plans of the API endpoints: index usage and estimated costs.
+
+Each case sends a request to an endpoint, with a representative combination
+of filters. The app is called in-process, and the statements it executes are
+recorded (see `app.profiling.record_queries`), so that the checked queries
+are exactly the ones the endpoints build. Each statement is then explained
+(EXPLAIN without ANALYZE, which does not execute it), and the tests of a
+case fail if:
+
+- a plan scans the tickets or flags tables sequentially, while the table has
+  more than `MAX_SEQ_SCAN_ROWS` rows (as estimated by the last ANALYZE)
+- the estimated cost of a statement is more than `COST_TOLERANCE` above its
+  cost in the baseline file, or the case executes a different number of
+  statements
+
+The tests use the database configured through the usual POSTGRES_*
+environment variables, and are skipped if POSTGRES_HOST is not set, or if
+the database was not filled with the `seed` command. Requests create flags
+and update tickets: use a test database, not the production one. The
+baseline was generated on an empty database filled by `seed` with its
+default parameters, then analyzed (ANALYZE): costs are only comparable on
+the same dataset. Usage:
+
+    python -m pytest tests/integration/test_query_plans.py
+    # After an intended plan change, to update the baseline
+    UPDATE_QUERY_PLANS_BASELINE=1 python -m pytest \\
+        tests/integration/test_query_plans.py
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import httpx
+import pytest
+
+from app import api
+from app.models import FlagModel, TicketModel, async_db, db
+from app.profiling import QueryRecord, record_queries
+
+pytestmark = pytest.mark.skipif(
+    "POSTGRES_HOST" not in os.environ, reason="no database is configured"
+)
+
+BASELINE = Path(__file__).parent / "query_plans.json"
+# Sequential scans of the checked tables are only allowed below this number
+# of rows
+MAX_SEQ_SCAN_ROWS = 10000
+# Allowed relative increase of the estimated costs
+COST_TOLERANCE = 0.2
+# Tables that must not be scanned sequentially
+CHECKED_TABLES = (TicketModel._meta.table_name, FlagModel._meta.table_name)
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+# User ID prefix of the flags created by the checks
+USER_ID_PREFIX = "query-plans-"
+
+
+class Sample(NamedTuple):
+    """Rows of the database the requests are built from."""
+
+    ticket_ids: list[int]
+    # Barcode and flavor of the first ticket
+    barcode: str
+    flavor: str
+    flag_id: int
+    # Creation date of the recent flags
+    recent: datetime
+
+
+class Case(NamedTuple):
+    name: str
+    method: str
+    path: Callable[[Sample], str]
+    params: Callable[[Sample], dict] = lambda sample: {}
+    json: Callable[[Sample], dict] | None = None
+
+
+def _flag(sample: Sample, user_id: str, barcode: str | None = None) -> dict:
+    barcode = barcode or sample.barcode
+    return {
+        "barcode": barcode,
+        "type": "product",
+        "flavor": sample.flavor,
+        "user_id": user_id,
+        "source": "robotoff",
+        "confidence": 0.9,
+        "reason": "other",
+    }
+
+
+def _run_id() -> str:
+    return uuid.uuid4().hex[:8]
+
+
+def _new_barcode() -> str:
+    return str(uuid.uuid4().int % 10**13)
+
+
+CASES = [
+    Case(
+        "create_flag.existing_ticket",
+        "POST",
+        lambda sample: "/api/v1/flags",
+        json=lambda sample: _flag(sample, f"{USER_ID_PREFIX}{_run_id()}"),
+    ),
+    Case(
+        "create_flag.new_ticket",
+        "POST",
+        lambda sample: "/api/v1/flags",
+        json=lambda sample: _flag(
+            sample, f"{USER_ID_PREFIX}{_run_id()}", barcode=_new_barcode()
+        ),
+    ),
+    Case(
+        "create_flags_bulk",
+        "POST",
+        lambda sample: "/api/v1/flags/bulk",
+        json=lambda sample: {
+            "flags": [
+                _flag(sample, f"{USER_ID_PREFIX}{_run_id()}", barcode=barcode)
+                for barcode in (sample.barcode, _new_barcode(), _new_barcode())
+            ]
+        },
+    ),
+    Case(
+        "get_flags.created_after",
+        "GET",
+        lambda sample: "/api/v1/flags",
+        lambda sample: {"created_after": sample.recent.isoformat()},
+    ),
+    Case(
+        "get_flags.created_after.flavor.source",
+        "GET",
+        lambda sample: "/api/v1/flags",
+        lambda sample: {
+            "created_after": sample.recent.isoformat(),
+            "flavor": "off",
+            "source": "web",
+        },
+    ),
+    Case(
+        "get_flag",
+        "GET",
+        lambda sample: f"/api/v1/flags/{sample.flag_id}",
+    ),
+    Case(
+        "get_tickets.open.created_at",
+        "GET",
+        lambda sample: "/api/v1/tickets",
+        lambda sample: {"status": "open"},
+    ),
+    Case(
+        "get_tickets.open.flag_count",
+        "GET",
+        lambda sample: "/api/v1/tickets",
+        lambda sample: {"status": "open", "order_by": "flag_count"},
+    ),
+    Case(
+        "get_tickets.open.reason.estimated",
+        "GET",
+        lambda sample: "/api/v1/tickets",
+        lambda sample: {"status": "open", "reason": "human", "count": "estimated"},
+    ),
+    Case(
+        "get_tickets.type.deep_page",
+        "GET",
+        lambda sample: "/api/v1/tickets",
+        lambda sample: {"type_": "image", "page": 100, "count": "none"},
+    ),
+    Case(
+        "get_tickets.barcode",
+        "GET",
+        lambda sample: "/api/v1/tickets",
+        lambda sample: {"barcode": sample.barcode},
+    ),
+    Case(
+        "get_tickets.cursor",
+        "GET",
+        lambda sample: "/api/v1/tickets",
+        lambda sample: {
+            "status": "open",
+            "count": "none",
+            # Cursor of a page in the middle of the listing
+            "cursor": api._encode_cursor(
+                {"id": sample.ticket_ids[0], "created_at": sample.recent},
+                api.TicketOrder.created_at,
+            ),
+        },
+    ),
+    Case(
+        "claim_tickets",
+        "POST",
+        lambda sample: "/api/v1/tickets/claim",
+        lambda sample: {"n": 10},
+    ),
+    Case(
+        "get_ticket",
+        "GET",
+        lambda sample: f"/api/v1/tickets/{sample.ticket_ids[0]}",
+    ),
+    Case(
+        "get_flags_by_ticket_batch",
+        "POST",
+        lambda sample: "/api/v1/flags/batch",
+        json=lambda sample: {"ticket_ids": sample.ticket_ids},
+    ),
+    Case(
+        "update_ticket_status",
+        "PUT",
+        lambda sample: f"/api/v1/tickets/{sample.ticket_ids[1]}/status",
+        lambda sample: {"status": "closed"},
+    ),
+    # Tickets are reopened then closed, so that both updates have tickets to
+    # update on each run
+    *(
+        Case(
+            f"update_tickets_status.{selection}.{status}",
+            "PUT",
+            lambda sample: "/api/v1/tickets/status",
+            json=lambda sample, selection=selection, status=status: {
+                "status": status,
+                **(
+                    {"ticket_ids": sample.ticket_ids}
+                    if selection == "ids"
+                    else {"barcode": sample.barcode}
+                ),
+            },
+        )
+        for selection in ("ids", "barcode")
+        for status in ("open", "closed")
+    ),
+    Case(
+        "get_stats",
+        "GET",
+        lambda sample: "/api/v1/stats",
+        lambda sample: {"series": True},
+    ),
+]
+
+
+def _load_sample() -> Sample:
+    # The oldest closed product tickets: the checks leave them closed, so
+    # that the same tickets are used, in the same state, on each run
+    with db:
+        tickets = list(
+            TicketModel.select()
+            .where(
+                TicketModel.type == "product",
+                TicketModel.status == "closed",
+            )
+            .order_by(TicketModel.id)
+            .limit(10)
+        )
+        if not tickets:
+            pytest.skip("the database must contain closed tickets")
+        latest_flag = (
+            FlagModel.select()
+            .where(~FlagModel.user_id.startswith(USER_ID_PREFIX))
+            .order_by(FlagModel.id.desc())
+            .get()
+        )
+    return Sample(
+        ticket_ids=[ticket.id for ticket in tickets],
+        barcode=tickets[0].barcode,
+        flavor=tickets[0].flavor,
+        flag_id=latest_flag.id,
+        recent=latest_flag.created_at - timedelta(hours=1),
+    )
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+async def _explain(query: QueryRecord, table_rows: dict[str, float]) -> dict:
+    async with async_db.atomic() as session:
+        plan = await session.scalar(
+            f"EXPLAIN (FORMAT JSON) {query.sql}", list(query.params)
+        )
+    root = plan[0]["Plan"]
+    indexes = set()
+    seq_scans = set()
+    for node in _walk(root):
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        # Unique indexes of ON CONFLICT clauses
+        indexes.update(node.get("Conflict Arbiter Indexes", []))
+        if node["Node Type"] == "Seq Scan":
+            seq_scans.add(node["Relation Name"])
+    return {
+        "sql": query.sql[:120],
+        "cost": root["Total Cost"],
+        "indexes": sorted(indexes),
+        "seq_scans": sorted(seq_scans),
+        # Only the checked tables above the row threshold are in `table_rows`
+        "large_seq_scans": sorted(seq_scans & table_rows.keys()),
+    }
+
+
+async def _run_cases(table_rows: dict[str, float]) -> dict:
+    sample = _load_sample()
+    # Requests are authenticated as Robotoff, which is allowed everywhere
+    token = uuid.uuid4().hex
+    os.environ["AUTH_BEARER_TOKEN_ROBOTOFF"] = token
+    await api.startup()
+    results = {}
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api.app),
+            base_url="http://query-plans",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=None,
+        ) as client:
+            for case in CASES:
+                with record_queries() as queries:
+                    response = await client.request(
+                        case.method,
+                        case.path(sample),
+                        params=case.params(sample),
+                        json=case.json(sample) if case.json else None,
+                    )
+                if response.status_code >= 400:
+                    raise RuntimeError(
+                        f"{case.name}: {response.status_code} {response.text}"
+                    )
+                results[case.name] = [
+                    await _explain(query, table_rows)
+                    for query in queries
+                    if query.sql.lstrip().split(None, 1)[0].upper()
+                    in EXPLAINED_STATEMENTS
+                ]
+    finally:
+        await api.shutdown()
+    return results
+
+
+@pytest.fixture(scope="module")
+def results() -> dict:
+    """Plans of the statements of each case, run once for all the tests."""
+    with db:
+        table_rows = dict(
+            db.execute_sql(
+                "SELECT relname, reltuples FROM pg_class WHERE relname IN %s",
+                (CHECKED_TABLES,),
+            )
+        )
+    if table_rows.get(TicketModel._meta.table_name, 0) <= MAX_SEQ_SCAN_ROWS:
+        pytest.skip("the database must be filled with the seed command")
+    # Only the checked tables above the row threshold are kept
+    results = asyncio.run(
+        _run_cases(
+            {
+                name: rows
+                for name, rows in table_rows.items()
+                if rows > MAX_SEQ_SCAN_ROWS
+            }
+        )
+    )
+    if os.environ.get("UPDATE_QUERY_PLANS_BASELINE"):
+        BASELINE.write_text(json.dumps(results, indent=2) + "\n")
+    return results
+
+
+@pytest.fixture(scope="module")
+def baseline(results: dict) -> dict:
+    # Read once the results are written, when the baseline is updated
+    return json.loads(BASELINE.read_text())
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.name)
+def test_no_large_sequential_scan(results: dict, case: Case):
+    scans = [
+        f"{statement['sql']}: sequential scan of {table}"
+        for statement in results[case.name]
+        for table in statement["large_seq_scans"]
+    ]
+    assert not scans
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.name)
+def test_cost_within_baseline(results: dict, baseline: dict, case: Case):
+    statements = results[case.name]
+    baseline_statements = baseline[case.name]
+    assert len(statements) == len(baseline_statements)
+    for statement, baseline_statement in zip(statements, baseline_statements):
+        assert statement["cost"] <= baseline_statement["cost"] * (
+            1 + COST_TOLERANCE
+        ), f"{statement['sql']}: estimated cost above the baseline"
@@ -0,0 +1,56 @@
+"""Column types of the models, compared with the database schema built by
+the migrations.
+
+The tests use the database configured through the usual POSTGRES_*
+environment variables, with all the migrations applied, and are skipped if
+POSTGRES_HOST is not set.
+"""
+
+import os
+
+import pytest
+from peewee import Field, Model
+
+from app.models import (
+    FlagModel,
+    ModeratorActionModel,
+    TicketDailyStatsModel,
+    TicketModel,
+    db,
+)
+
+pytestmark = pytest.mark.skipif(
+    "POSTGRES_HOST" not in os.environ, reason="no database is configured"
+)
+
+MODELS = (TicketModel, FlagModel, ModeratorActionModel, TicketDailyStatsModel)
+# Names of the types in the DDL of peewee, and in `format_type` of PostgreSQL
+TYPE_NAMES = {
+    "SERIAL": "integer",
+    "TIMESTAMP": "timestamp without time zone",
+    "VARCHAR": "character varying",
+}
+
+
+def _model_type(field: Field) -> str:
+    ctx = db.get_sql_context()
+    ctx.sql(field.ddl_datatype(ctx))
+    ddl = ctx.query()[0]
+    name, _, rest = ddl.partition("(")
+    return TYPE_NAMES.get(name, name.lower()) + (f"({rest}" if rest else "")
+
+
+@pytest.mark.parametrize("model", MODELS, ids=lambda model: model.__name__)
+def test_column_types(model: type[Model]):
+    with db:
+        columns = dict(
+            db.execute_sql(
+                "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped",
+                (model._meta.table_name,),
+            )
+        )
+    fields = model._meta.sorted_fields
+    assert {field.column_name: _model_type(field) for field in fields} == {
+        field.column_name: columns.get(field.column_name) for field in fields
+    }
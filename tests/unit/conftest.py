@@ -0,0 +1,28 @@
+import pytest
+
+from app import response_cache
+from app.middleware import auth_client, session_cache
+
+
+class FakeClock:
+    """Replacement of the `time` module of the tested modules: the clock only
+    moves when `advance` is called."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    perf_counter = monotonic
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    for module in (auth_client, session_cache, response_cache):
+        monkeypatch.setattr(module, "time", clock)
+    return clock
@@ -0,0 +1,43 @@
+"""Cursors of the ticket listing."""
+
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import TicketOrder, _decode_cursor, _encode_cursor
+
+TICKET = {"id": 42, "created_at": datetime(2024, 5, 17, 8, 30, 12, 5), "flag_count": 3}
+
+
+@pytest.mark.parametrize("order_by", list(TicketOrder))
+def test_cursor_round_trip(order_by: TicketOrder):
+    cursor = _encode_cursor(TICKET, order_by)
+    assert _decode_cursor(cursor, order_by) == (TICKET[order_by], TICKET["id"])
+
+
+def _cursor(payload: str) -> str:
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+@pytest.mark.parametrize(
+    "cursor, order_by",
+    [
+        ("not base64!", TicketOrder.created_at),
+        (_cursor("not json"), TicketOrder.created_at),
+        (_cursor("42"), TicketOrder.flag_count),
+        (_cursor("[3]"), TicketOrder.flag_count),
+        (_cursor('{"a": 1, "b": 2}'), TicketOrder.flag_count),
+        (_cursor('["yesterday", 42]'), TicketOrder.created_at),
+        (_cursor("[null, 42]"), TicketOrder.created_at),
+        (_cursor('["three", 42]'), TicketOrder.flag_count),
+        (_cursor("[3, [42]]"), TicketOrder.flag_count),
+        # Cursor of the other order
+        (_encode_cursor(TICKET, TicketOrder.created_at), TicketOrder.flag_count),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor: str, order_by: TicketOrder):
+    with pytest.raises(HTTPException) as exc_info:
+        _decode_cursor(cursor, order_by)
+    assert exc_info.value.status_code == 400
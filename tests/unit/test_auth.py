@@ -0,0 +1,106 @@
+"""Lookups of the user data of sessions, with a mock auth server."""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.middleware import auth
+from app.middleware.auth_client import AuthClient
+from app.middleware.session_cache import LocalSessionCache, SessionCache
+
+AUTH_URL = "https://world.openfoodfacts.test/cgi/auth.pl"
+
+
+class AuthServer:
+    """Mock auth server: the "valid" session is the session of a moderator,
+    all the other ones are invalid."""
+
+    def __init__(self):
+        self.requests: list[httpx.Request] = []
+        self.user = {"userid": "alice", "moderator": 1}
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers["Cookie"] != "session=valid":
+            return httpx.Response(403)
+        return httpx.Response(200, json={"user": dict(self.user)})
+
+
+@pytest.fixture
+def auth_server(monkeypatch, clock) -> AuthServer:
+    server = AuthServer()
+    client = AuthClient()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(server.handle))
+    monkeypatch.setattr(auth, "auth_client", client)
+    monkeypatch.setattr(
+        auth,
+        "session_cache",
+        SessionCache(
+            LocalSessionCache(100), stale_ttl=settings.session_cache_stale_ttl
+        ),
+    )
+
+    # Invalid sessions are rejected after a delay
+    async def sleep(delay: float):
+        pass
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return server
+
+
+def test_concurrent_lookups_share_one_call(auth_server: AuthServer):
+    async def run():
+        return await asyncio.gather(
+            *(auth._get_user_data_cached("valid", AUTH_URL) for _ in range(5))
+        )
+
+    assert asyncio.run(run()) == [auth_server.user] * 5
+    assert len(auth_server.requests) == 1
+    assert not auth._pending_lookups
+
+    # Later lookups are served from the cache
+    assert asyncio.run(run()) == [auth_server.user] * 5
+    assert len(auth_server.requests) == 1
+
+
+def test_stale_session_is_served_while_refreshed(auth_server: AuthServer, clock):
+    async def run():
+        user_data = await auth._get_user_data_cached("valid", AUTH_URL)
+        # Wait for the background refresh, if any
+        await asyncio.gather(*auth._pending_lookups.values())
+        return user_data
+
+    assert asyncio.run(run())["userid"] == "alice"
+    auth_server.user["userid"] = "bob"
+
+    clock.advance(settings.session_cache_ttl)
+    assert asyncio.run(run())["userid"] == "alice"
+    assert len(auth_server.requests) == 2
+    assert asyncio.run(run())["userid"] == "bob"
+    assert len(auth_server.requests) == 2
+
+    # Once the stale entry expires too, the lookup waits for the auth server
+    auth_server.user["userid"] = "carol"
+    clock.advance(settings.session_cache_ttl + settings.session_cache_stale_ttl)
+    assert asyncio.run(run())["userid"] == "carol"
+    assert len(auth_server.requests) == 3
+
+
+def test_invalid_session_is_cached_for_negative_ttl(auth_server: AuthServer, clock):
+    def lookup():
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(auth._get_user_data_cached("invalid", AUTH_URL))
+        assert exc_info.value.status_code == 401
+
+    lookup()
+    clock.advance(settings.session_cache_negative_ttl - 1)
+    lookup()
+    assert len(auth_server.requests) == 1
+
+    # Invalid sessions are not kept as stale entries
+    clock.advance(1)
+    lookup()
+    assert len(auth_server.requests) == 2
@@ -0,0 +1,109 @@
+"""Circuit breaker of the auth server client."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.middleware.auth_client import (
+    AuthClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+)
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    # A success resets the count of consecutive failures
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.closed
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state is CircuitState.open
+    assert not breaker.allow()
+    assert breaker.rejections == 1
+
+
+def test_circuit_closes_after_successful_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(29)
+    assert not breaker.allow()
+
+    clock.advance(1)
+    # Only one trial request is let through
+    assert breaker.allow()
+    assert breaker.state is CircuitState.half_open
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state is CircuitState.closed
+    assert breaker.allow()
+    assert breaker.rejections == 2
+
+
+def test_circuit_reopens_after_failed_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow()
+
+    # A single failure of the trial request opens the circuit again, for
+    # another `reset_timeout`
+    breaker.record_failure()
+    assert breaker.state is CircuitState.open
+    clock.advance(29)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+
+
+def test_cancelled_trial_lets_next_request_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow()
+
+    breaker.record_cancellation()
+    assert breaker.state is CircuitState.open
+    assert breaker.allow()
+    assert breaker.state is CircuitState.half_open
+
+
+def test_auth_client_fails_fast_while_server_fails(clock):
+    status_codes = [502, 502, 200]
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(status_codes[len(requests) - 1])
+
+    async def run():
+        client = AuthClient()
+        client.circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            for _ in range(2):
+                assert (await client.get("https://auth.test")).status_code == 502
+            with pytest.raises(CircuitOpenError):
+                await client.get("https://auth.test")
+            assert len(requests) == 2
+
+            clock.advance(30)
+            assert (await client.get("https://auth.test")).status_code == 200
+            return client.stats()
+        finally:
+            await client.close()
+
+    stats = asyncio.run(run())
+    assert stats.requests == 3
+    assert stats.responses_by_status == {502: 2, 200: 1}
+    assert stats.circuit_state is CircuitState.closed
+    assert stats.circuit_rejections == 1
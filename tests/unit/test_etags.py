@@ -0,0 +1,36 @@
+"""Matching of the If-None-Match header."""
+
+import pytest
+
+from app.etags import etag_matches, make_etag
+
+ETAG = make_etag("get_ticket", 42, "2024-05-17T08:30:12")
+
+
+def test_etag_is_strong_and_stable():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert ETAG == make_etag("get_ticket", 42, "2024-05-17T08:30:12")
+    assert ETAG != make_etag("get_ticket", 43, "2024-05-17T08:30:12")
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    [
+        ETAG,
+        f"W/{ETAG}",
+        "*",
+        " * ",
+        f'"other", {ETAG}',
+        f'"other",W/{ETAG} , "another"',
+    ],
+)
+def test_if_none_match_matches(if_none_match: str):
+    assert etag_matches(if_none_match, ETAG)
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    [None, "", '"other"', f'"other", W/"{ETAG}"', ETAG.strip('"'), f"{ETAG}x"],
+)
+def test_if_none_match_does_not_match(if_none_match: str | None):
+    assert not etag_matches(if_none_match, ETAG)
@@ -0,0 +1,60 @@
+"""Request metrics of the Prometheus middleware."""
+
+import asyncio
+
+import httpx
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.metrics import PrometheusMiddleware
+
+
+async def _events():
+    yield b"data: {}\n\n"
+
+
+async def list_items(request):
+    return JSONResponse([])
+
+
+async def stream_items(request):
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
+app = Starlette(
+    routes=[
+        Route("/test-metrics/items", list_items),
+        Route("/test-metrics/items/events", stream_items),
+    ],
+    middleware=[Middleware(PrometheusMiddleware)],
+)
+
+
+def _count(metric: str, route: str) -> float:
+    labels = {"method": "GET", "route": route, "status": "200"}
+    return REGISTRY.get_sample_value(f"{metric}_count", labels) or 0
+
+
+def test_event_streams_are_recorded_separately():
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            await client.get("/test-metrics/items")
+            await client.get("/test-metrics/items/events")
+
+    asyncio.run(run())
+    assert _count("http_request_duration_seconds", "/test-metrics/items") == 1
+    assert _count("http_stream_duration_seconds", "/test-metrics/items") == 0
+    assert _count("http_stream_duration_seconds", "/test-metrics/items/events") == 1
+    assert _count("http_request_duration_seconds", "/test-metrics/items/events") == 0
+    assert (
+        REGISTRY.get_sample_value(
+            "http_request_db_duration_seconds_count",
+            {"route": "/test-metrics/items/events"},
+        )
+        is None
+    )
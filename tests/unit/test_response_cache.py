@@ -0,0 +1,63 @@
+"""Keys, invalidation and expiration of the response cache."""
+
+import pytest
+
+from app.config import settings
+from app.response_cache import ResponseCache
+
+ROUTE = "get_tickets"
+
+
+@pytest.fixture
+def cache(monkeypatch) -> ResponseCache:
+    monkeypatch.setattr(settings, "response_cache_enabled", True)
+    monkeypatch.setattr(settings, "response_cache_ttl", {ROUTE: 30})
+    return ResponseCache(max_size=2)
+
+
+def test_key_is_normalized():
+    key = ResponseCache.key(ROUTE, status="open", reason=["b", "a"], barcode=None)
+    assert key == ResponseCache.key(ROUTE, reason=["a", "b"], status="open")
+    assert key != ResponseCache.key(ROUTE, reason=["a", "b"], status="closed")
+    assert key != ResponseCache.key("get_stats", reason=["a", "b"], status="open")
+
+
+def test_response_is_served_for_its_version(cache: ResponseCache):
+    key = ResponseCache.key(ROUTE, page=1)
+    response = cache.set(ROUTE, key, 7, {"tickets": []}, headers={"ETag": '"x"'})
+    cached = cache.get(ROUTE, key, 7)
+    assert cached.body == response.body == b'{"tickets":[]}'
+    assert cached.headers["ETag"] == '"x"'
+
+    # The data changed since the response was cached
+    assert cache.get(ROUTE, key, 8) is None
+    # The stale entry was removed
+    assert cache.get(ROUTE, key, 7) is None
+
+
+def test_response_expires_after_route_ttl(cache: ResponseCache, clock):
+    key = ResponseCache.key(ROUTE, page=1)
+    cache.set(ROUTE, key, 7, {"tickets": []})
+    clock.advance(29)
+    assert cache.get(ROUTE, key, 7) is not None
+    clock.advance(1)
+    assert cache.get(ROUTE, key, 7) is None
+
+
+def test_routes_without_ttl_are_not_cached(cache: ResponseCache):
+    key = ResponseCache.key("get_stats")
+    assert cache.set("get_stats", key, 7, {}).body == b"{}"
+    assert cache.get("get_stats", key, 7) is None
+
+
+def test_least_recently_used_responses_are_evicted(cache: ResponseCache):
+    keys = [ResponseCache.key(ROUTE, page=page) for page in (1, 2, 3)]
+    cache.set(ROUTE, keys[0], 7, {})
+    cache.set(ROUTE, keys[1], 7, {})
+    assert cache.get(ROUTE, keys[0], 7) is not None
+    cache.set(ROUTE, keys[2], 7, {})
+    assert [cache.get(ROUTE, key, 7) is not None for key in keys] == [
+        True,
+        False,
+        True,
+    ]
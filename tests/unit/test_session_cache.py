@@ -0,0 +1,119 @@
+"""Tiers, expiration and eviction of the session cache."""
+
+import asyncio
+
+from app.middleware.session_cache import (
+    CacheEntry,
+    LocalSessionCache,
+    SessionCache,
+    SessionCacheBackend,
+)
+
+USER = {"userid": "alice", "moderator": 1}
+
+
+class DictSessionCache(SessionCacheBackend):
+    """Shared tier stored in a dict, without expiration."""
+
+    def __init__(self):
+        self.entries: dict[str, CacheEntry] = {}
+        self.failing = False
+
+    async def get(self, key: str) -> CacheEntry | None:
+        if self.failing:
+            raise ConnectionError("store is down")
+        return self.entries.get(key)
+
+    async def set(self, key: str, user_data: dict | None, ttl: float):
+        if self.failing:
+            raise ConnectionError("store is down")
+        self.entries[key] = CacheEntry(user_data, ttl)
+
+
+def test_least_recently_used_entries_are_evicted():
+    async def run():
+        cache = LocalSessionCache(max_size=2)
+        await cache.set("a", USER, 60)
+        await cache.set("b", USER, 60)
+        # "a" becomes the most recently used entry
+        assert await cache.get("a") is not None
+        await cache.set("c", USER, 60)
+        return cache, [await cache.get(key) is not None for key in "abc"]
+
+    cache, cached = asyncio.run(run())
+    assert cached == [True, False, True]
+    assert len(cache) == 2
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_their_ttl(clock):
+    async def run():
+        cache = LocalSessionCache(max_size=10)
+        await cache.set("a", USER, 60)
+        clock.advance(59)
+        entry = await cache.get("a")
+        clock.advance(1)
+        return cache, entry, await cache.get("a")
+
+    cache, entry, expired = asyncio.run(run())
+    assert entry == CacheEntry(USER, 1)
+    assert expired is None
+    assert len(cache) == 0
+    assert cache.expirations == 1
+
+
+def test_valid_sessions_are_kept_stale(clock):
+    async def run():
+        cache = SessionCache(LocalSessionCache(10), stale_ttl=300)
+        await cache.set("valid", USER, 60)
+        await cache.set("invalid", None, 60)
+        clock.advance(60)
+        valid, invalid = await cache.get("valid"), await cache.get("invalid")
+        return cache, valid, invalid
+
+    cache, valid, invalid = asyncio.run(run())
+    assert valid == CacheEntry(USER, 300)
+    assert cache.is_stale(valid)
+    # Invalid sessions are not extended
+    assert invalid is None
+    stats = cache.stats()
+    assert (stats.hits, stats.stale_hits, stats.misses) == (1, 1, 1)
+
+
+def test_shared_tier_fills_local_tier(clock):
+    shared = DictSessionCache()
+
+    async def run():
+        worker_1 = SessionCache(LocalSessionCache(10), shared)
+        worker_2 = SessionCache(LocalSessionCache(10), shared)
+        await worker_1.set("valid", USER, 60)
+        await worker_1.set("invalid", None, 30)
+        entries = [await worker_2.get(key) for key in ("valid", "invalid")]
+        # The second lookup is served by the local tier
+        shared.entries.clear()
+        return worker_2, entries, await worker_2.get("valid")
+
+    worker_2, entries, local_entry = asyncio.run(run())
+    assert entries == [CacheEntry(USER, 60), CacheEntry(None, 30)]
+    assert local_entry == CacheEntry(USER, 60)
+    stats = worker_2.stats()
+    assert (stats.shared_hits, stats.local_hits) == (2, 1)
+    assert stats.negative_hits == 1
+
+
+def test_shared_tier_errors_are_misses():
+    shared = DictSessionCache()
+    shared.failing = True
+
+    async def run():
+        cache = SessionCache(LocalSessionCache(10), shared)
+        await cache.set("valid", USER, 60)
+        # The local tier is still updated
+        local_entry = await cache.get("valid")
+        cache.local = LocalSessionCache(10)
+        return cache, local_entry, await cache.get("valid")
+
+    cache, local_entry, entry = asyncio.run(run())
+    assert local_entry is not None
+    assert entry is None
+    assert cache.stats().shared_errors == 2